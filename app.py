@@ -6,21 +6,18 @@ from widgets.main_menu import MainMenu
 import pygame
 from mutagen.mp3 import MP3
 
+import argparse
+import os
 import random
 
 import time
-from terrain import Terrain
+import logs
+from terrain import generateTerrain, canvasMultiplier
+from recording import Replay
 
-#### HELPER FUNCTIONS ###################
-def generateTerrain(terrainSize, terrainType, heightMapPath=None, levels=15, invert=True):
-    """
-    Generates a terrain based on the given parameters.
-    """
-    canvasMultiplier = {"small": 1.5, "large": 2}
-    terrain = Terrain(int(256*canvasMultiplier[terrainSize]), int(256*canvasMultiplier[terrainSize]), invert=invert)
-    terrain.load(heightMapPath, terrainType, levels=levels)
-    return terrain
+logger = logs.getLogger("app")
 
+#### HELPER FUNCTIONS ###################
 
 def playSong(songIdx):
     pygame.mixer.music.load(playlist[songIdx][0])
@@ -32,11 +29,11 @@ def scheduleNextSong(sim):
     inbetweenDelay = 5 #seconds
     duration = int(playlist[songIdx][2] + inbetweenDelay)*1000
     
-    print(f"Now playing: [{songIdx+1}] {playlist[songIdx][0]}")
+    logger.info("Now playing: [%d] %s", songIdx+1, playlist[songIdx][0])
     playSong(songIdx)
 
     songIdx = (songIdx+1) % len(playlist)
-    print(f"Next in queue: [{songIdx+1}] {playlist[songIdx][0]}")
+    logger.info("Next in queue: [%d] %s", songIdx+1, playlist[songIdx][0])
     sim.after(duration, lambda: scheduleNextSong(sim))
     
 #### SIMULATION MUSIC ###################################################################################
@@ -52,6 +49,15 @@ pygame.mixer.init()
 
 ### MAIN CODE ######################################################
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HerdSim")
+    parser.add_argument("--record", metavar="PATH", help="stream every tick of the run to a recording")
+    parser.add_argument("--replay", metavar="PATH", help="play a recording back instead of simulating")
+    parser.add_argument("--seed", type=int, help="seed for the world's random draws, so a run can be repeated")
+    parser.add_argument("--log", metavar="SPEC", default=os.environ.get("HERDSIM_LOG", "info"),
+                        help='log levels, e.g. "info,boid=debug" (default: $HERDSIM_LOG, else "info"); F2 dumps the event counters')
+    args = parser.parse_args()
+    logs.configure(args.log)
+    
     MainMenu()
     
     terrainSize = "large"
@@ -59,10 +65,20 @@ if __name__ == "__main__":
     invert = True  # Invert the greyscale and gradients for better visualization
     nContours = 15
     heightMapPath = r"terrain\small4(512)(512)(0.4572)(699.7683454453672).png"
+    
+    replay = None
+    if args.replay:
+        # the recording says which terrain and behaviours it was made with
+        replay = Replay(args.replay)
+        replay.loadBehaviours()
+        recorded = replay.header["terrain"]
+        terrainSize = {int(256*multiplier): size for size, multiplier in canvasMultiplier.items()}[recorded["width"]]
+        terrainType, heightMapPath = recorded["terrain-type"], recorded["heightmap"]
+        nContours, invert = recorded["levels"], recorded["invert"]
     terrain = generateTerrain(terrainSize, terrainType, heightMapPath, nContours, invert=invert)
     
     # Create the simulation with the generated terrain
-    s = Simulation(terrainSize, terrain)
+    s = Simulation(terrainSize, terrain, record=args.record, replay=replay, seed=args.seed)
     scheduleNextSong(s)
     s.canvas.update(60, ti=time.time())
     s.mainloop()
\ No newline at end of file
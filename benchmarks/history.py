@@ -0,0 +1,69 @@
+"""
+Rewind history: memory per boid, restore accuracy and the memory bound.
+
+Records a seeded run into a History, reports the bytes per boid per
+record and the time spent recording, and checks that restoring a tick
+puts every boid back within the quantization step. Then records the same
+run into a History too small for even one keyframe group, and checks it
+keeps the newest group and can still restore from it.
+
+Run from the repository root:
+    python -m benchmarks.history
+    python -m benchmarks.history --boids 5000 --steps 600
+"""
+import argparse
+import time
+
+import numpy as np
+
+from headless import Simulation
+from history import History
+
+
+def record(args, history):
+    """Runs the scenario into history. Returns the simulation, the seconds spent recording and the positions by tick."""
+    sim = Simulation.fromScenario({"spawn": {"Sheep": args.boids}, "seed": args.seed})
+    positions = {}
+    recording = 0
+    for tick in range(1, args.steps + 1):
+        sim.step()
+        t0 = time.perf_counter()
+        history.record(sim.world, tick)
+        recording += time.perf_counter() - t0
+        positions[tick] = sim.world.herds["Sheep"].position.copy()
+    return sim, recording, positions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boids", type=int, default=1000)
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    history = History()
+    sim, recording, positions = record(args, history)
+    perRecord = history.nbytes/(len(history)*args.boids)
+    print(f"{args.boids} sheep, {args.steps} steps: {len(history)} records, {history.nbytes/1024:.1f} KiB, "
+          f"{perRecord:.2f} bytes/boid/record, {1e3*recording/args.steps:.3f} ms/step recording")
+
+    step = History.resolution["position"]
+    for tick in (history.oldestTick(), (history.oldestTick() + history.newestTick())//2, history.newestTick()):
+        restored = history.restore(sim.world, tick)
+        error = np.abs(sim.world.herds["Sheep"].position - positions[restored]).max()
+        assert error <= step/2 + 1e-9, f"restoring tick {restored} moved boids by {error}"
+    print(f"restores within {step/2} px of the recorded positions")
+
+    # too small for a single keyframe group: every record must still be kept or evicted cleanly
+    tiny = History(stride=1, keyframeInterval=100, maxBytes=6000)
+    sim, _, positions = record(args, tiny)
+    assert len(tiny) and tiny.newestTick() == args.steps, "the newest record was evicted"
+    assert tiny.records[0].keyframe, "the oldest kept record can't be decoded"
+    restored = tiny.restore(sim.world, tiny.newestTick())
+    error = np.abs(sim.world.herds["Sheep"].position - positions[restored]).max()
+    assert error <= step/2 + 1e-9, "restoring from an over-budget history moved the boids"
+    print(f"over-budget history keeps its newest group: {len(tiny)} records, {tiny.nbytes/1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Compiled (Numba) vs NumPy flocking kernels.
+
+Runs the same seeded scenario with both backends, checks they agree after the
+first step, and compares the time spent in the "rules" phase: the steering
+rules, terrain drag and integration that herd_jit.flockStep fuses into one
+pass. The two only differ by rounding, but flocking amplifies that over many
+steps, so only the first step is compared. That step is also not timed, since
+it compiles the kernel (or loads it from Numba's cache).
+
+Run from the repository root:
+    python -m benchmarks.jit_kernels
+"""
+import argparse
+
+import numpy as np
+
+import herd_jit
+from headless import Simulation
+
+
+def run(args, n, jit):
+    scenario = {"spawn": {"Sheep": n}, "seed": args.seed, "terrain-size": "large", "jit": jit,
+                "heightmap": args.heightmap}
+    sim = Simulation.fromScenario(scenario)
+    sim.world.setGoal("Sheep", np.array([sim.world.width/2, sim.world.height/2]))
+    sim.step(1)
+    state = np.concatenate([np.concatenate([herd.position, herd.velocity], axis=1) for herd in sim.world.herds.values()])
+    sim.world.timer.reset()
+    sim.run(args.steps)
+    return sim.world.timer.averages(), state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 5000])
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--heightmap", help="greyscale heightmap, so terrain drag is exercised")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not herd_jit.available:
+        raise SystemExit("Numba is not installed (pip install numba).")
+
+    print(f"{'N':>7} {'numpy rules (ms)':>17} {'jit rules (ms)':>15} {'speedup':>8} {'step: numpy/jit (ms)':>21}")
+    for n in args.sizes:
+        numpyPhases, numpyState = run(args, n, jit=False)
+        jitPhases, jitState = run(args, n, jit=True)
+        assert np.allclose(numpyState, jitState, rtol=0, atol=1e-9), "Compiled kernels disagree with the NumPy kernels"
+        print(f"{n:>7} {1e3*numpyPhases['rules']:>17.2f} {1e3*jitPhases['rules']:>15.2f} "
+              f"{numpyPhases['rules']/jitPhases['rules']:>7.1f}x "
+              f"{1e3*numpyPhases['step']:>10.2f}/{1e3*jitPhases['step']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Neighbour query benchmark: SpatialGrid vs the brute-force scan.
+
+Boids are scattered at constant density, so the number of neighbours per boid
+stays the same as N grows and the grid should scale close to linearly.
+
+Run from the repository root:
+    python -m benchmarks.neighbours
+"""
+import argparse
+import time
+
+import numpy as np
+
+import boid
+from spatial import SpatialGrid
+
+AREA_PER_BOID = 40*40  # px^2 per boid, roughly one boid per flockmate-range square
+
+
+def spawnSheep(n, rng):
+    side = np.sqrt(n*AREA_PER_BOID)
+    sheep = [boid.factory("Sheep", rng.uniform(0, side, 2)) for _ in range(n)]
+    return sheep
+
+
+def timeGrid(sheep):
+    grid = SpatialGrid()
+    t0 = time.perf_counter()
+    grid.rebuild(sheep, boid.neighbourhoodRadius())
+    results = [animal.computeNeighbours(sheep, grid) for animal in sheep]
+    return time.perf_counter() - t0, results
+
+
+def timeBruteForce(sheep):
+    t0 = time.perf_counter()
+    results = [animal.computeNeighbours(sheep) for animal in sheep]
+    return time.perf_counter() - t0, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[250, 500, 1000, 2000, 5000, 10000])
+    parser.add_argument("--brute-force-limit", type=int, default=2000, help="skip the O(N^2) scan above this size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'N':>7} {'grid (s)':>10} {'us/boid':>9} {'brute (s)':>10} {'speedup':>8}")
+    for n in args.sizes:
+        sheep = spawnSheep(n, rng)
+        gridTime, gridResults = timeGrid(sheep)
+
+        if n <= args.brute_force_limit:
+            bruteTime, bruteResults = timeBruteForce(sheep)
+            assert all([id(b) for b in g] == [id(b) for b in f] for g, f in zip(gridResults, bruteResults)), \
+                "Grid neighbours differ from the brute-force scan"
+            brute = f"{bruteTime:>10.3f} {bruteTime/gridTime:>7.1f}x"
+        else:
+            brute = f"{'-':>10} {'-':>8}"
+
+        print(f"{n:>7} {gridTime:>10.3f} {1e6*gridTime/n:>9.1f} {brute}")
+
+
+if __name__ == "__main__":
+    main()
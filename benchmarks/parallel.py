@@ -0,0 +1,81 @@
+"""
+Tile workers: agreement with the single-process step, and speedup.
+
+Runs the same seeded scenario in one process and then with each worker
+count, in both border modes, and checks the boids end up in exactly the
+same places with the same flocks. Reports the time per step, and where it
+goes: the workers' phases (search, steer) and the main process's serial
+ones (publish and collect copy the state in and out of shared memory,
+sort orders the pairs, merges runs the flock merges and leaves).
+
+With fewer cores than workers, the workers take turns and the step is
+slower than one process. "ideal" is then the time per step if each worker
+had a core of its own: the serial phases plus the workers' phases divided
+by the worker count. It is an upper bound on the speedup, not a measurement.
+
+Run from the repository root:
+    python -m benchmarks.parallel
+    python -m benchmarks.parallel --heightmap terrain/island.png --workers 2 4 6 --flock-aggregates
+"""
+import argparse
+import os
+
+import numpy as np
+
+from headless import Simulation
+from world import flockLabels
+
+
+def run(args, borderMode, workers):
+    scenario = {"spawn": {"Sheep": args.boids, "Lion": args.lions}, "seed": args.seed,
+                "terrain-size": args.terrain_size, "heightmap": args.heightmap, "border-mode": borderMode,
+                "flock-aggregates": args.flock_aggregates, "jit": args.jit, "workers": workers}
+    sim = Simulation.fromScenario(scenario)
+    try:
+        sim.step()  # starts the workers' shared arrays outside the timing
+        sim.world.timer.reset()
+        elapsed = sim.run(args.steps)
+        phases = {name: total/args.steps for name, total in sim.world.timer.totals.items()}
+    finally:
+        sim.close()
+    herds = [herd for herd in sim.world.herds.values() if len(herd)]
+    positions = np.concatenate([herd.position for herd in herds])
+    flocks = np.concatenate([flockLabels(herd)[1] for herd in herds])
+    return elapsed, phases, positions, flocks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boids", type=int, default=2000)
+    parser.add_argument("--lions", type=int, default=5)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--terrain-size", choices=["small", "large"], default="large")
+    parser.add_argument("--heightmap", help="greyscale heightmap image, flat terrain if omitted")
+    parser.add_argument("--flock-aggregates", action="store_true")
+    parser.add_argument("--jit", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    print(f"{args.boids} sheep, {args.lions} lions, {args.steps} steps, {cores} cores")
+    columns = ("publish", "search", "sort", "merges", "steer", "collect")
+    print(f"{'border':>7} {'workers':>8} {'ms/step':>8} {'speedup':>8} {'ideal':>7} "
+          + " ".join(f"{name:>8}" for name in columns))
+    for borderMode in ("Bounce", "Wrap"):
+        baseTime, _, basePositions, baseFlocks = run(args, borderMode, 1)
+        print(f"{borderMode:>7} {1:>8} {1e3*baseTime/args.steps:>8.2f} {1:>7.2f}x")
+        for workers in args.workers:
+            elapsed, phases, positions, flocks = run(args, borderMode, workers)
+            assert np.array_equal(positions, basePositions), f"{workers} workers moved the boids differently ({borderMode})"
+            assert np.array_equal(flocks, baseFlocks), f"{workers} workers formed different flocks ({borderMode})"
+            perStep = elapsed/args.steps
+            inWorkers = phases.get("search", 0) + phases.get("steer", 0)
+            ideal = perStep - inWorkers + inWorkers/workers if workers > cores else perStep
+            print(f"{borderMode:>7} {workers:>8} {1e3*perStep:>8.2f} {baseTime/elapsed:>7.2f}x "
+                  f"{baseTime/args.steps/ideal:>6.2f}x "
+                  + " ".join(f"{1e3*phases.get(name, 0):>8.2f}" for name in columns))
+
+
+if __name__ == "__main__":
+    main()
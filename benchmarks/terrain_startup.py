@@ -0,0 +1,78 @@
+"""
+Terrain startup benchmark for every bundled heightmap in terrain/.
+
+Times a cold Terrain.load, a warm load from the TerrainCache and the
+gradient field alone at the "small" and "large" canvas sizes, and checks the
+vectorized gradient field against the per-pixel compute_gradient reference.
+
+Run from the repository root:
+    python -m benchmarks.terrain_startup
+"""
+import argparse
+import glob
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from terrain import Terrain, canvasMultiplier
+from terrain_cache import TerrainCache
+
+
+def referenceGradientField(terrain):
+    """The original per-pixel loop, kept as the regression reference."""
+    h, w = terrain.heightmap.shape
+    gradient_field = np.zeros((h, w, 2), dtype=float)
+    for y in range(h):
+        for x in range(w):
+            gradient_field[y, x] = -1*terrain.compute_gradient(x, y)
+    return gradient_field
+
+
+def timeLoad(path, size, check, cacheDir):
+    timings = {}
+
+    terrain = Terrain(size, size, cache=False)
+    t0 = time.perf_counter()
+    terrain.load(path)
+    timings["load"] = time.perf_counter() - t0
+
+    cache = TerrainCache(cacheDir)
+    Terrain(size, size, cache=cache).load(path)  # populate the cache
+    t0 = time.perf_counter()
+    Terrain(size, size, cache=cache).load(path)
+    timings["warm"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    field = terrain.generateGradientField()
+    timings["gradient"] = time.perf_counter() - t0
+
+    if check:
+        t0 = time.perf_counter()
+        reference = referenceGradientField(terrain)
+        timings["reference"] = time.perf_counter() - t0
+        assert np.array_equal(field, reference), f"Gradient field differs from the reference for {path}"
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--no-check", dest="check", action="store_false",
+                        help="skip the slow per-pixel reference comparison")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join("terrain", "*.png")) + glob.glob(os.path.join("terrain", "*.jpg")))
+    print(f"{'heightmap':<45} {'size':>5} {'cold (s)':>9} {'warm (s)':>9} {'gradient (ms)':>14} {'reference (s)':>14}")
+    with tempfile.TemporaryDirectory() as cacheDir:
+        for path in paths:
+            for terrainSize, multiplier in canvasMultiplier.items():
+                size = int(256*multiplier)
+                timings = timeLoad(path, size, args.check, cacheDir)
+                reference = f"{timings['reference']:>14.2f}" if args.check else f"{'-':>14}"
+                print(f"{os.path.basename(path)[:45]:<45} {size:>5} {timings['load']:>9.3f} {timings['warm']:>9.3f} "
+                      f"{1e3*timings['gradient']:>14.2f} {reference}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Micro-benchmark: vector.py (NumPy on length-2 arrays) vs vec2.py (plain floats).
+
+Each operation is timed on the same random vectors with both modules, and the
+results are checked to agree. The last row times the inner loop of a scalar
+neighbour query, the pattern the per-boid update repeats for every candidate.
+
+Run from the repository root:
+    python -m benchmarks.vectors
+"""
+import argparse
+import math
+import timeit
+
+import numpy as np
+
+import vec2
+import vector
+
+
+def viewConeNumpy(heading, offsets, viewAngle):
+    return [np.arccos(vector.dot(vector.unit(heading), vector.unit(r))) <= viewAngle for r in offsets]
+
+
+def viewConeFloats(heading, offsets, viewAngle):
+    heading = vec2.unit(heading)
+    return [math.acos(min(max(vec2.dot(heading, vec2.unit(r)), -1.0), 1.0)) <= viewAngle for r in offsets]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=100000, help="calls per timing")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    a, b = rng.normal(size=(2, 2))
+    ta, tb = vec2.vec(a), vec2.vec(b)
+
+    cases = [
+        ("dot", lambda: vector.dot(a, b), lambda: vec2.dot(ta, tb)),
+        ("ssq", lambda: vector.ssq(a), lambda: vec2.ssq(ta)),
+        ("magnitude", lambda: vector.magnitude(a), lambda: vec2.magnitude(ta)),
+        ("unit", lambda: vector.unit(a), lambda: vec2.unit(ta)),
+        ("a - b", lambda: a - b, lambda: vec2.sub(ta, tb)),
+    ]
+    print(f"{'operation':>16} {'numpy (us)':>11} {'floats (us)':>12} {'speedup':>8}")
+    for name, numpyCall, floatCall in cases:
+        assert np.allclose(numpyCall(), floatCall()), f"vec2 {name} differs from vector {name}"
+        numpyTime = timeit.timeit(numpyCall, number=args.number)
+        floatTime = timeit.timeit(floatCall, number=args.number)
+        print(f"{name:>16} {1e6*numpyTime/args.number:>11.3f} {1e6*floatTime/args.number:>12.3f} {numpyTime/floatTime:>7.1f}x")
+
+    offsets = rng.normal(size=(50, 2))
+    floatOffsets = [vec2.vec(r) for r in offsets]
+    viewAngle = np.deg2rad(90)
+    assert viewConeNumpy(a, offsets, viewAngle) == viewConeFloats(ta, floatOffsets, viewAngle)
+    number = max(args.number//len(offsets), 1)
+    numpyTime = timeit.timeit(lambda: viewConeNumpy(a, offsets, viewAngle), number=number)
+    floatTime = timeit.timeit(lambda: viewConeFloats(ta, floatOffsets, viewAngle), number=number)
+    perCandidate = number*len(offsets)
+    print(f"{'view cone/cand.':>16} {1e6*numpyTime/perCandidate:>11.3f} {1e6*floatTime/perCandidate:>12.3f} {numpyTime/floatTime:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Verlet neighbour lists: rebuild frequency and speedup over searching every tick.
+
+Runs the same seeded scenario without Verlet lists and then with each skin,
+checks the boids end up in exactly the same places (a Verlet list only skips
+searches whose result could not have changed), and reports how often the
+lists were rebuilt and the time per step.
+
+Run from the repository root:
+    python -m benchmarks.verlet
+    python -m benchmarks.verlet --scalar --boids 300 --steps 100
+"""
+import argparse
+
+import numpy as np
+
+from headless import Simulation
+
+
+def run(args, skin):
+    scenario = {"spawn": {"Sheep": args.boids}, "seed": args.seed, "terrain-size": args.terrain_size,
+                "vectorized": not args.scalar, "verlet-skin": skin}
+    sim = Simulation.fromScenario(scenario)
+    elapsed = sim.run(args.steps)
+    positions = np.concatenate([herd.position for herd in sim.world.herds.values()])
+    return elapsed, positions, sim.world.verlet
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boids", type=int, default=2000)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--skins", type=float, nargs="+", default=[2, 5, 10, 20])
+    parser.add_argument("--terrain-size", choices=["small", "large"], default="large")
+    parser.add_argument("--scalar", action="store_true", help="benchmark the boid-by-boid engine")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    baseTime, basePositions, _ = run(args, None)
+    print(f"{args.boids} sheep, {args.steps} steps ({'scalar' if args.scalar else 'vectorized'})")
+    print(f"{'skin':>6} {'ms/step':>8} {'rebuilds':>9} {'ticks/rebuild':>14} {'speedup':>8}")
+    print(f"{'none':>6} {1e3*baseTime/args.steps:>8.2f} {args.steps:>9} {1:>14.1f} {1:>7.2f}x")
+    for skin in args.skins:
+        elapsed, positions, verlet = run(args, skin)
+        assert np.array_equal(positions, basePositions), f"Verlet lists with skin {skin} changed the simulation"
+        print(f"{skin:>6g} {1e3*elapsed/args.steps:>8.2f} {verlet.rebuilds:>9} "
+              f"{verlet.updates/verlet.rebuilds:>14.1f} {baseTime/elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
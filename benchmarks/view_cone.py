@@ -0,0 +1,106 @@
+"""
+View-cone test: the dot-product threshold vs the arccos reference.
+
+Draws random headings and offsets (including zero vectors, and offsets exactly
+along, against and perpendicular to the heading) for a range of view angles,
+and checks that vec2.inViewCone and herd.inViewCone include exactly the pairs
+the arccos test includes. Pairs whose angle is within --tolerance radians of
+the view angle are skipped, since rounding can put those on either side in
+either test. Then times both forms.
+
+Run from the repository root:
+    python -m benchmarks.view_cone
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+import herd as kernels
+import vec2
+from boid import SpeciesParams
+
+
+def arccosReference(heading, r, viewAngle):
+    """The original test: angle between the unit vectors, zero vectors counting as perpendicular."""
+    cosTheta = vec2.dot(vec2.unit(heading), vec2.unit(r))
+    return math.acos(min(max(cosTheta, -1.0), 1.0)) <= math.radians(viewAngle)
+
+
+def angleBetween(heading, r):
+    if vec2.ssq(heading) == 0 or vec2.ssq(r) == 0:
+        return math.pi/2
+    return abs(math.atan2(heading[0]*r[1] - heading[1]*r[0], vec2.dot(heading, r)))
+
+
+def samplePairs(rng, n):
+    headings = rng.normal(size=(n, 2))*rng.uniform(0, 20, (n, 1))
+    offsets = rng.normal(size=(n, 2))*rng.uniform(0, 40, (n, 1))
+    k = n//8
+    headings[:k] = 0                                     # boid standing still
+    offsets[k:2*k] = 0                                   # boids on top of each other
+    offsets[2*k:3*k] = headings[2*k:3*k]*3               # straight ahead
+    offsets[3*k:4*k] = -headings[3*k:4*k]*2              # straight behind
+    offsets[4*k:5*k] = headings[4*k:5*k, ::-1]*(1, -1)   # exactly perpendicular
+    return headings, offsets
+
+
+def cosViewAngle(viewAngle):
+    params = {name: [0, 0, 0, int, 1] for name in ("max-velocity", "flockmate-range")}
+    params["view-angle"] = [0, 0, 0, int, viewAngle]
+    params["size"] = 1
+    return SpeciesParams(params, version=0).cosViewAngle
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", type=int, default=20000)
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    headings, offsets = samplePairs(rng, args.pairs)
+    headingList = [tuple(h) for h in headings.tolist()]
+    offsetList = [tuple(r) for r in offsets.tolist()]
+    angles = np.array([angleBetween(h, r) for h, r in zip(headingList, offsetList)])
+
+    checked = 0
+    for viewAngle in [1, 10, 45, 60, 89, 90, 91, 120, 135, 179, 180]:
+        cosAngle = cosViewAngle(viewAngle)
+        reference = np.array([arccosReference(h, r, viewAngle) for h, r in zip(headingList, offsetList)])
+        scalar = np.array([vec2.inViewCone(h, r, cosAngle) for h, r in zip(headingList, offsetList)])
+        vectorized = kernels.inViewCone(headings, offsets, cosAngle)
+
+        clear = np.abs(angles - math.radians(viewAngle)) > args.tolerance
+        if viewAngle == 90:
+            clear |= angles == math.pi/2  # perpendicular and zero vectors are exactly on the edge and must be inside
+        if viewAngle == 180:
+            clear[:] = True  # everything is inside, straight behind included
+        for name, result in (("vec2", scalar), ("herd", vectorized)):
+            wrong = np.flatnonzero(clear & (result != reference))
+            assert not len(wrong), (f"{name}.inViewCone differs from arccos at view-angle {viewAngle} "
+                                    f"for heading {headings[wrong[0]]}, offset {offsets[wrong[0]]}")
+        checked += clear.sum()
+    print(f"view cone: {checked} pair/angle cases match the arccos test")
+
+    cosAngle = cosViewAngle(90)
+    t0 = time.perf_counter()
+    [arccosReference(h, r, 90) for h, r in zip(headingList, offsetList)]
+    t1 = time.perf_counter()
+    [vec2.inViewCone(h, r, cosAngle) for h, r in zip(headingList, offsetList)]
+    t2 = time.perf_counter()
+    with np.errstate(invalid="ignore"):
+        np.arccos(np.einsum("ij,ij->i", kernels.unitRows(headings), kernels.unitRows(offsets))) <= np.deg2rad(90)
+    t3 = time.perf_counter()
+    kernels.inViewCone(headings, offsets, cosAngle)
+    t4 = time.perf_counter()
+    n = args.pairs
+    print(f"{'':>10} {'arccos (ns/pair)':>17} {'dot (ns/pair)':>14} {'speedup':>8}")
+    print(f"{'scalar':>10} {1e9*(t1 - t0)/n:>17.1f} {1e9*(t2 - t1)/n:>14.1f} {(t1 - t0)/(t2 - t1):>7.1f}x")
+    print(f"{'vectorized':>10} {1e9*(t3 - t2)/n:>17.1f} {1e9*(t4 - t3)/n:>14.1f} {(t3 - t2)/(t4 - t3):>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,16 @@
 ########## IMPORTS ####################################
 import numpy as np
-from PIL import Image, ImageTk
 import copy
 import time
-from vector import dot, magnitude, ssq, unit, vectorAngle
+import math
+import vec2
+import sprites
+import logs
+from herd import Herd, HerdField
+from terrain import terrain_drag, terrain_speed
 # import threading
 
+logger = logs.getLogger("boid")
 
 ##### PARAMETERS #######################################
 default_behaviours = {
@@ -94,8 +99,10 @@ param_short_names = {
 
 lastModified = None
 
-def updateParamBoundaries():
-    sheep = behaviours["Sheep"]
+def updateParamBoundaries(params=None):
+    """Clamps the sliders' ranges to each other, in params (behaviours by default)."""
+    params = params if params is not None else behaviours
+    sheep = params["Sheep"]
     sheep["max-velocity"][0] = sheep["cruising-speed"][4]
     sheep["cruising-speed"][1] = sheep["max-velocity"][4]
     sheep["comfort-zone"][0] = sheep["size"] + 1
@@ -104,7 +111,7 @@ def updateParamBoundaries():
     sheep["flockmate-range"][0] = sheep["comfort-zone"][4]
     sheep["obstacle-range"][0] = sheep["size"]
     
-    penguin = behaviours["Penguin"]
+    penguin = params["Penguin"]
     penguin["max-velocity"][0] = penguin["cruising-speed"][4]
     penguin["cruising-speed"][1] = penguin["max-velocity"][4]
     penguin["comfort-zone"][0] = penguin["size"] + 1
@@ -113,73 +120,247 @@ def updateParamBoundaries():
     penguin["flockmate-range"][0] = penguin["comfort-zone"][4]
     penguin["obstacle-range"][0] = penguin["size"]
     
+#### COMPILED PARAMETERS ##############################################
+# Hot loops read a flat per-species record instead of nested behaviours lookups.
+# Anything that edits behaviours calls behavioursChanged(), and records built
+# for an older version are rebuilt on their next lookup.
+behavioursVersion = 0
+compiledParams = {}
+
+def behavioursChanged():
+    """Marks the behaviours as edited so the compiled parameters are rebuilt."""
+    global behavioursVersion
+    behavioursVersion += 1
+
+def setBehaviours(edited):
+    """
+    Replaces the behaviours with a finished, edited copy. Call it on the
+    thread that steps the world, between ticks (see SimThread.setBehaviours).
+    """
+    for species, params in copy.deepcopy(edited).items():
+        behaviours[species] = params
+    behavioursChanged()
+
+class SpeciesParams:
+    """Current values of one species' behaviours, with the derived quantities the update needs."""
+    __slots__ = ("version", "size", "herdSize", "maxAcceleration", "maxVelocity", "maxVelocity2",
+                 "headingScale", "cruisingSpeed", "comfortZone", "comfortZone2", "dangerZone",
+                 "dangerZone2", "pushScale", "flockmateRange", "flockmateRange2", "viewAngle",
+                 "cosViewAngle", "dragFactor")
+
+    def __init__(self, params, version):
+        value = lambda name: params[name][4] if name in params else None
+        self.version = version
+        self.size = params["size"]
+        self.herdSize = value("herd-size")
+        self.maxAcceleration = value("max-acceleration")
+        self.maxVelocity = value("max-velocity")
+        self.maxVelocity2 = self.maxVelocity**2
+        self.headingScale = 1/(self.maxVelocity/2)  # alignment and goal seeking divide by half the max velocity
+        self.cruisingSpeed = value("cruising-speed")
+        self.comfortZone = value("comfort-zone")
+        self.dangerZone = value("danger-zone")
+        self.flockmateRange = value("flockmate-range")
+        self.viewAngle = value("view-angle")  # degrees either side of the heading
+        self.dragFactor = value("drag-factor")
+
+        self.comfortZone2 = self.dangerZone2 = self.pushScale = None
+        if self.comfortZone is not None:
+            self.comfortZone2 = self.comfortZone**2
+            self.dangerZone2 = self.dangerZone**2
+            gap = self.comfortZone2 - self.dangerZone2
+            self.pushScale = 1/gap if gap else math.inf
+        self.flockmateRange2 = self.cosViewAngle = None
+        if self.flockmateRange is not None:
+            self.flockmateRange2 = self.flockmateRange**2
+            # exactly 0 at 90 degrees, so the perpendicular and zero-vector cases stay inside
+            self.cosViewAngle = 0.0 if self.viewAngle == 90 else math.cos(math.radians(self.viewAngle))
+
+def speciesParams(species):
+    """The compiled parameters of a species, rebuilt if the behaviours changed since."""
+    params = compiledParams.get(species)
+    if params is None or params.version != behavioursVersion:
+        params = compiledParams[species] = SpeciesParams(behaviours[species], behavioursVersion)
+    return params
+
+def neighbourhoodRadius():
+    """Largest flockmate-range across all species, used as the spatial grid cell size."""
+    ranges = [params["flockmate-range"][4] for params in behaviours.values() if "flockmate-range" in params]
+    return max(ranges, default=1)
+
 def accumulate(accumulatorVector, vectorToAdd):
-    temp = accumulatorVector + vectorToAdd
-    if ssq(temp) <= 1:
+    """
+    Adds vectorToAdd to the 2-element list accumulatorVector in place,
+    truncating at unit length. Returns the new magnitude.
+    """
+    temp = vec2.add(accumulatorVector, vectorToAdd)
+    if vec2.ssq(temp) <= 1:
         accumulatorVector[:] = temp
-        return magnitude(temp)
+        return vec2.magnitude(temp)
     else:
         #print("Accumulation failed. Resulting vector exceeds unit length.")
-        a = ssq(vectorToAdd)
-        b = 2*dot(accumulatorVector, vectorToAdd)
-        c = ssq(accumulatorVector) - 1
-        t = (-b + np.sqrt(b**2 - 4*a*c)) / (2*a)
-        accumulatorVector[:] += t * vectorToAdd
+        a = vec2.ssq(vectorToAdd)
+        b = 2*vec2.dot(accumulatorVector, vectorToAdd)
+        c = vec2.ssq(accumulatorVector) - 1
+        t = (-b + math.sqrt(b**2 - 4*a*c)) / (2*a)
+        accumulatorVector[:] = vec2.add(accumulatorVector, vec2.scale(vectorToAdd, t))
         return 1
         
 #### BOID FACTORY ####################################################
-def factory(species, pos):
+# draws for boids created without a generator; a World passes its own seeded one
+defaultRng = np.random.default_rng()
+
+def speciesClass(species):
+    """The Boid subclass the factory instantiates for a species."""
     if species == "Sheep":
-        return Sheep(pos)
+        return Sheep
     elif species == "Penguin":
-        return Penguin(pos)
+        return Penguin
+    return Boid
+
+def spawnBatch(species, positions, herd, rng=None):
+    """
+    Creates a boid of the species at each of positions in herd, like
+    factory does one at a time. The new rows are drawn and written as
+    whole arrays, and the Boid objects are only wired up to them.
+    """
+    rng = rng if rng is not None else defaultRng
+    positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+    n = len(positions)
+    params = speciesParams(species)
+    # same distribution as Boid.__init__: a uniform heading, and a speed of 0-100% of max-velocity in 1% steps
+    randomAngle = rng.uniform(0, 2*np.pi, n)
+    speed = (rng.integers(0, 101, n)/100)*params.maxVelocity
+    velocity = speed[:, None]*np.stack([np.cos(randomAngle), np.sin(randomAngle)], axis=1)
+    
+    cls = speciesClass(species)
+    boids = [cls.__new__(cls) for _ in range(n)]
+    start = herd.extend(boids, position=positions, origin=positions, velocity=velocity, mass=1, size=params.size)
+    for k, boid in enumerate(boids):
+        boid.species = species
+        boid.herd = herd
+        boid.attachRow(start + k)
+    logger.debug("Created %d %s", n, species)
+    logs.count(f"spawn.{species}", n)
+    return boids
+
+def factory(species, pos, herd=None, rng=None):
+    if species == "Sheep":
+        return Sheep(pos, herd=herd, rng=rng)
+    elif species == "Penguin":
+        return Penguin(pos, herd=herd, rng=rng)
     else:
-        print("Species not in factory. Instantiating superclass.")
-        return Boid(species=species, pos=pos)
+        logger.warning("Species %s not in factory. Instantiating superclass.", species)
+        return Boid(species=species, pos=pos, herd=herd, rng=rng)
+
+#### NEIGHBOURHOOD ##################################################
+class Neighbourhood:
+    """
+    One boid's neighbours for a tick, sorted into bands by a single pass
+    over the candidates. Each band keeps the offset to the neighbour
+    (neighbour position - own position) so the steering rules never
+    recompute it.
+    """
+    __slots__ = ("visible", "offsets", "comfort", "danger", "flockmates", "flockOffsets")
+
+    def __init__(self):
+        self.visible = []       # in flockmate-range and inside the view cone
+        self.offsets = []       # offset to each visible neighbour
+        self.comfort = []       # (offset, squared distance) of visible neighbours inside the comfort zone only
+        self.danger = []        # (offset, squared distance) of visible neighbours inside the danger zone
+        self.flockmates = []    # visible neighbours in the same flock, see classifyFlockmates
+        self.flockOffsets = []
+
+    def classifyFlockmates(self, flock):
+        """Picks out the visible neighbours that belong to flock (a flock root)."""
+        self.flockmates = []
+        self.flockOffsets = []
+        for neighbour, offset in zip(self.visible, self.offsets):
+            if neighbour.flock is flock:
+                self.flockmates.append(neighbour)
+                self.flockOffsets.append(offset)
+        return self.flockmates
 
 ####### SUPER CLASS ##################################################
 class Boid():
-    def __init__(self, species, pos):
-        print("Creating boid")
+    # per-boid state lives in the boid's Herd; these attributes are views of its row
+    position = HerdField()
+    velocity = HerdField()
+    acceleration = HerdField()
+    netForce = HerdField()
+    origin = HerdField()
+    time_alive = HerdField()  # track time since spawn
+    mass = HerdField()
+    size = HerdField()
+    hasVisableNeighbours = HerdField()
+    
+    flocking = False  # whether the species runs the flocking rules
+    seeksGoal = False
+    navigatesTerrain = False
+    useFlockAggregates = False  # cohesion and alignment from the whole flock's running sums
+    
+    def __init__(self, species, pos, herd=None, rng=None):
+        logger.debug("Creating %s at (%s, %s)", species, pos[0], pos[1])
+        logs.count(f"spawn.{species}")
         self.species = species
-        self.mass = 1
-        self.size = behaviours[species]["size"]
+        self.herd = herd if herd is not None else Herd(species)
+        assert self.herd.species == species, "Boid species must match its herd."
+        
+        # start heading and speed come from the world's generator, so a seeded world spawns the same boids
+        rng = rng if rng is not None else defaultRng
+        randomAngle = rng.uniform(0, 2 * np.pi)
+        velocity = (rng.integers(0,101)/100)*speciesParams(self.species).maxVelocity*np.array([np.cos(randomAngle), np.sin(randomAngle)], dtype=float)
+        
+        index = self.herd.append(self,
+                                 position=(pos[0], pos[1]),
+                                 origin=(pos[0], pos[1]),
+                                 velocity=velocity,
+                                 mass=1,
+                                 size=speciesParams(species).size)
+        self.attachRow(index)
+    
+    def attachRow(self, index):
+        """Sets up the boid's own attributes once its state is at row index of its herd."""
+        self.index = index
         self.image = None
         self.tkImage = None
         self.imagePath = None
         self.canvasId = None
         
-        self.flock = Flock(species, members=[self])
+        self._flock = None
+        Flock(self.species, members=[self])
+        self.neighbourhood = Neighbourhood()
         self.neighbours = []
         self.flockNeighbours = []
         
-        self.goal = None
-        
-        #flags
-        self.hasVisableNeighbours = False 
-        
-        self.position = np.array([pos[0], pos[1]], dtype=float)
-        self.origin = np.array([pos[0], pos[1]], dtype=float)
-
-        randomAngle = np.random.uniform(0, 2 * np.pi)
-        self.velocity = (np.random.randint(0,101)/100)*behaviours[self.species]["max-velocity"][4]*np.array([np.cos(randomAngle), np.sin(randomAngle)], dtype=float)
-        
-        self.acceleration = np.array([0, 0], dtype=float)
-        self.netForce = np.array([0, 0], dtype=float)
-        
-        self.time_alive = 0  # track time since spawn
+    @property
+    def flock(self):
+        """Root of the boid's flock. Two boids share a flock iff their flocks are the same object."""
+        root = self._flock.find()
+        self._flock = root
+        return root
+    
+    @property
+    def goal(self):
+        return self.herd.goal[self.index] if self.herd.hasGoal[self.index] else None
+    
+    @goal.setter
+    def goal(self, goal):
+        self.herd.hasGoal[self.index] = goal is not None
+        if goal is not None:
+            self.herd.goal[self.index] = goal
         
     def setGoal(self, goal):
         self.goal = goal
     
     def loadImage(self, path):
-        print("Loading image at", path)
-        self.image = Image.open(path).resize((self.size, self.size))
-        self.tkImage = ImageTk.PhotoImage(self.image)
-        self.imagePath = path       
+        """Points the boid at the shared sprite for path at its size (see sprites.py)."""
+        self.image = sprites.image(path, self.size)
+        self.tkImage = sprites.photo(path, self.size)
+        self.imagePath = path
         
 
-    def update(self, boids, terrain,dt):
+    def update(self, boids, terrain, dt, grid=None):
         self.time_alive += dt
         t = self.time_alive
         a = 2  # spiral scale factor (adjust for tightness)
@@ -192,20 +373,32 @@ class Boid():
         self.position = self.origin + np.array([x, y])
     
     def updatePosition(self,terrain, dt):
-        gradVelocityComponent = dot(unit(self.velocity), terrain.gradientField[int(self.position[1])][int(self.position[0])])
-        slopeCorrectionFactor = 1/np.sqrt(gradVelocityComponent**2 +1)
-        self.position += slopeCorrectionFactor*self.velocity*dt
+        position = vec2.vec(self.position)
+        velocity = vec2.vec(self.velocity)
+        x, y = int(position[0]), int(position[1])
+        gradVelocityComponent = vec2.dot(vec2.unit(velocity), terrain.gradientField[y, x].tolist())
+        slopeCorrectionFactor = 1/math.sqrt(gradVelocityComponent**2 +1)
+        terrainSpeed = terrain_speed[terrain.typegrid[y, x]]
+        step = vec2.scale(velocity, terrainSpeed*slopeCorrectionFactor*dt)
+        self.position = vec2.add(position, step)
+        if self.useFlockAggregates:
+            self.flock.shift(dPosition=step)
     
     def updateVelocity(self, dt):
-        self.velocity += self.acceleration*dt
+        previous = vec2.vec(self.velocity)
+        velocity = vec2.add(previous, vec2.scale(vec2.vec(self.acceleration), dt))
         
-        if ssq(self.velocity) > behaviours[self.species]["max-velocity"][4]**2:
+        params = speciesParams(self.species)
+        if vec2.ssq(velocity) > params.maxVelocity2:
             # Limit the velocity to max-velocity
-            self.velocity = unit(self.velocity) * behaviours[self.species]["max-velocity"][4]
+            velocity = vec2.scale(vec2.unit(velocity), params.maxVelocity)
+        self.velocity = velocity
+        if self.useFlockAggregates:
+            self.flock.shift(dVelocity=vec2.sub(velocity, previous))
             
     
     def updateAcceleration(self):
-        self.acceleration = self.netForce/self.mass
+        self.acceleration = vec2.scale(vec2.vec(self.netForce), 1/self.mass)
     
     def resizeImage(self, newSize):
         if self.size == newSize: return
@@ -233,20 +426,38 @@ class Boid():
                 self.position[1] = (self.size/2 if hitTop else h-self.size/2)
                 self.velocity[1] *= -1
     
-    def computeNeighbours(self, boids):
-        neighbours = []
-        self.hasVisableNeighbours = False
+    def classifyNeighbours(self, boids, grid=None):
+        """
+        Sorts the boids within flockmate-range and inside the view cone into
+        a Neighbourhood, in one pass. When a SpatialGrid is given, only the
+        boids in nearby cells are tested instead of every boid in boids.
+        """
+        params = speciesParams(self.species)
+        if grid is not None:
+            boids = grid.candidates(self.position, params.flockmateRange)
+        
+        position = vec2.vec(self.position)
+        velocity = vec2.vec(self.velocity)
+        neighbourhood = Neighbourhood()
         for boid in boids:
             if boid is self: continue
             
-            r = boid.position - self.position
-            rxr = ssq(r)
-            if rxr <= behaviours[self.species]["flockmate-range"][4]**2:
-                theta = np.arccos(dot(unit(self.velocity), unit(r)))
-                if theta <= np.deg2rad(behaviours[self.species]["view-angle"][4]):
-                    neighbours.append(boid)
-                    self.hasVisableNeighbours = True
-        return neighbours
+            r = vec2.sub(boid.position.tolist(), position)
+            rxr = vec2.ssq(r)
+            if rxr <= params.flockmateRange2 and vec2.inViewCone(velocity, r, params.cosViewAngle):
+                neighbourhood.visible.append(boid)
+                neighbourhood.offsets.append(r)
+                if rxr < params.comfortZone2:
+                    if rxr <= params.dangerZone2:
+                        neighbourhood.danger.append((r, rxr))
+                    else:
+                        neighbourhood.comfort.append((r, rxr))
+        self.hasVisableNeighbours = len(neighbourhood.visible) > 0
+        return neighbourhood
+    
+    def computeNeighbours(self, boids, grid=None):
+        """Returns the boids within flockmate-range and inside the view cone."""
+        return self.classifyNeighbours(boids, grid).visible
     
     def mergeFlock(self, other):      
         if self.species == other.species:
@@ -255,26 +466,13 @@ class Boid():
                 return False
                 
             combined_size = self.flock.size + other.flock.size
-            max_herd_size = behaviours[self.species]["herd-size"][4]
+            max_herd_size = speciesParams(self.species).herdSize
             
             #print(f"Debug: Attempting to merge flocks - self.flock.size={self.flock.size}, other.flock.size={other.flock.size}, max={max_herd_size}")
             
             if combined_size <= max_herd_size:
-                # Get references to both flocks
-                self_flock = self.flock
-                other_flock = other.flock
-                
-                # Combine all members from both flocks
-                all_members = self_flock.members + other_flock.members
-                
-                # Create new flock with all members
-                newFlock = Flock(self.species, members=all_members)
-                
-                # Update all members to point to the new flock
-                for member in all_members:
-                    member.flock = newFlock
-                
-                #print(f"Merged flocks. New size: {newFlock.size}")
+                self.flock.union(other.flock)
+                #print(f"Merged flocks. New size: {self.flock.size}")
                 return True
             else:
                 #print(f"Failed to merge flocks. Combined size ({combined_size}) would exceed max ({max_herd_size})")
@@ -285,124 +483,127 @@ class Boid():
 
     def leaveFlock(self):
         self.flock.remove_member(self)
-        self.flock = Flock(species=self.species, members=[self])
         
 
+    def visibleFlockmates(self):
+        """
+        The visible neighbours that share this boid's flock. Flock members
+        are a subset of all boids, so filtering the neighbours gives the same
+        set as testing every member.
+        """
+        flockmates = self.neighbourhood.classifyFlockmates(self.flock)
+        self.hasVisableNeighbours = len(flockmates) > 0
+        return flockmates
+
     def keepDistance(self):
-        if len(self.neighbours) == 0:
-            return np.array([0,0], dtype=float)
-        
-        change = np.array([0,0], dtype=float)
-        for neighbour in self.neighbours:
-            #vector pointing to the other boid
-            dist = neighbour.position - self.position
-            mag2 = ssq(dist)
-            comfortZone2 = behaviours[self.species]["comfort-zone"][4]**2
-            dangerZone2 = behaviours[self.species]["danger-zone"][4]**2
-            if mag2 < comfortZone2:
-                # other boid is too close push away
-                # decide how strongly to accelerate away
-                pushStrength = (comfortZone2 - mag2) / (comfortZone2-dangerZone2)
-                
-                if pushStrength > 1:
-                    pushStrength = 1
-                    
-                dist = unit(dist)*pushStrength
-                change -= dist
+        """Pushes away from every visible neighbour inside the comfort zone, at full strength inside the danger zone."""
+        params = speciesParams(self.species)
+        change = (0.0, 0.0)
+        for dist, mag2 in self.neighbourhood.comfort:
+            # other boid is too close push away
+            # decide how strongly to accelerate away
+            pushStrength = min((params.comfortZone2 - mag2)*params.pushScale, 1)
+            change = vec2.sub(change, vec2.scale(dist, pushStrength/math.sqrt(mag2)))
+        for dist, mag2 in self.neighbourhood.danger:
+            if mag2 > 0:
+                change = vec2.sub(change, vec2.scale(dist, 1/math.sqrt(mag2)))
                 
-        if ssq(change) > 1:
-            return unit(change)
-        return change
+        return vec2.clampUnit(change)
         
+    def flockmateMean(self, total, own):
+        """Mean of a flock total over every member but this boid."""
+        return vec2.scale(vec2.sub(total, own), 1/(self.flock.size - 1))
+    
     def matchHeading(self):
         if len(self.flockNeighbours) == 0:
-            return np.array([0,0], dtype=float)
+            return (0.0, 0.0)
         
-        avgVelocity = np.array([0,0], dtype=float)    
-        count = 0
-        
-        for neighbour in self.flockNeighbours:
-            avgVelocity += neighbour.velocity
-            count += 1
-            
-        if count == 0:
-            return np.array([0,0], dtype=float)
-        
-        avgVelocity /= count
-        
-        change = (avgVelocity - self.velocity)/(behaviours[self.species]["max-velocity"][4]/2)
-        if ssq(change) > 1:
-            return unit(change) 
-        return change
+        velocity = vec2.vec(self.velocity)
+        if self.useFlockAggregates:
+            avgVelocity = self.flockmateMean(self.flock.sumVelocity, velocity)
+        else:
+            sumX = sumY = 0.0
+            for neighbour in self.flockNeighbours:
+                vx, vy = neighbour.velocity.tolist()
+                sumX += vx
+                sumY += vy
+            count = len(self.flockNeighbours)
+            avgVelocity = (sumX/count, sumY/count)
+        
+        change = vec2.scale(vec2.sub(avgVelocity, velocity), speciesParams(self.species).headingScale)
+        return vec2.clampUnit(change)
     
     def steerToCenter(self):
         if len(self.flockNeighbours) == 0:
-            return np.array([0,0], dtype=float)
-        
-        avgPosition = np.array([0,0], dtype=float)
-        count = 0
+            return (0.0, 0.0)
         
-        for neighbour in self.flockNeighbours:
-            avgPosition += neighbour.position
-            count += 1
-            
-        if count == 0:
-            return np.array([0,0], dtype=float)
-        
-        avgPosition /= count
-        
-        change = (avgPosition - self.position)/50
-        if ssq(change) > 1:
-            return unit(change)
-        return change
+        if self.useFlockAggregates:
+            position = vec2.vec(self.position)
+            centerOffset = vec2.sub(self.flockmateMean(self.flock.sumPosition, position), position)
+        else:
+            # mean offset to the flockmates, the same as their mean position minus our own
+            sumX = sumY = 0.0
+            for dx, dy in self.neighbourhood.flockOffsets:
+                sumX += dx
+                sumY += dy
+            count = len(self.neighbourhood.flockOffsets)
+            centerOffset = (sumX/count, sumY/count)
+        
+        change = vec2.scale(centerOffset, 1/50)
+        return vec2.clampUnit(change)
    
     def gotoGoal(self):
-        desiredVelocity = self.goal - self.position
+        desiredVelocity = vec2.sub(vec2.vec(self.goal), vec2.vec(self.position))
+        params = speciesParams(self.species)
+        cruisingSpeed = params.cruisingSpeed
        
-        if ssq(desiredVelocity) > behaviours[self.species]["cruising-speed"][4]:
-            desiredVelocity = unit(desiredVelocity)*behaviours[self.species]["cruising-speed"][4]
+        if vec2.ssq(desiredVelocity) > cruisingSpeed:
+            desiredVelocity = vec2.scale(vec2.unit(desiredVelocity), cruisingSpeed)
 
-        change = (desiredVelocity- self.velocity)/(behaviours[self.species]["max-velocity"][4]/2)
-        
-        if magnitude(change) > 1:
-            return unit(change)
-        
-        return change
+        change = vec2.scale(vec2.sub(desiredVelocity, vec2.vec(self.velocity)), params.headingScale)
+        return vec2.clampUnit(change)
    
     def navigateTerrain(self, terrain):
-        grad = terrain.gradientField[int(self.position[1])][int(self.position[0])]
+        position = vec2.vec(self.position)
+        x, y = int(position[0]), int(position[1])
+        grad = terrain.gradientField[y, x].tolist()
         # print(f"grad at ({self.position[0]}{self.position[1]}):", grad)
-        slope = magnitude(grad)
+        slope = vec2.magnitude(grad)
+        dragFactor = speciesParams(self.species).dragFactor*terrain_drag[terrain.typegrid[y, x]]
         
-        F = np.array([0,0], dtype=float)
         if slope > 0:
             # component of velocity parallel to the gradient
-            vdotg = dot(self.velocity, grad)
+            vdotg = vec2.dot(vec2.vec(self.velocity), grad)
             
+            F = (0.0, 0.0)
             if vdotg > 0: #boid travelling uphill
-                F = (-behaviours[self.species]["drag-factor"][4]*vdotg / slope)*grad
+                F = vec2.scale(grad, -dragFactor*vdotg / slope)
                 
             elif vdotg < 0: # boid travelling downhill
-                F = (-(behaviours[self.species]["drag-factor"][4]/5)*vdotg / slope)*grad  #downhill dragfactor = dragfactor/5
+                F = vec2.scale(grad, -(dragFactor/5)*vdotg / slope)  #downhill dragfactor = dragfactor/5
             
-            self.netForce += F
+            self.netForce = vec2.add(vec2.vec(self.netForce), F)
             
             
             
         
 #### SPECIES CLASSES ###############
 class Sheep(Boid):
-    def __init__(self, pos):
-        print(f"Creating sheep at position: ({pos[0]},{pos[1]})")
-        super().__init__(species="Sheep", pos=pos)
+    flocking = True
+    seeksGoal = True
+    navigatesTerrain = True
     
-    def update(self, boids, terrain, dt):
-        self.neighbours = self.computeNeighbours(boids)
+    def __init__(self, pos, herd=None, rng=None):
+        super().__init__(species="Sheep", pos=pos, herd=herd, rng=rng)
+    
+    def update(self, boids, terrain, dt, grid=None):
+        self.neighbourhood = self.classifyNeighbours(boids, grid)
+        self.neighbours = self.neighbourhood.visible
         for neighbour in self.neighbours:
             if self.mergeFlock(neighbour):
                 break
             
-        self.flockNeighbours = self.computeNeighbours(self.flock.members)
+        self.flockNeighbours = self.visibleFlockmates()
         
         #if no flockNeighbours, leave flock
         if len(self.flockNeighbours) == 0:
@@ -424,7 +625,7 @@ class Sheep(Boid):
         self.netForce = self.navigator()
         
     def navigator(self):
-        acc = np.array([0, 0], dtype=float)
+        acc = [0.0, 0.0]
         mag = 0
         
         # mag = accumulate(acc, self.avoidObstacles())
@@ -439,33 +640,36 @@ class Sheep(Boid):
         if mag < 1 and self.goal is not None:
             mag = accumulate(acc, self.gotoGoal())    
         
-        acc *= behaviours[self.species]["max-acceleration"][4]*self.mass  # Scale by max acceleration * mass
-        return acc
+        return vec2.scale(acc, speciesParams(self.species).maxAcceleration*self.mass)  # Scale by max acceleration * mass
 
 class Penguin(Boid):
-    def __init__(self, pos):
-        print(f"Creating sheep at position: ({pos[0]},{pos[1]})")
-        super().__init__(species="Penguin", pos=pos)
+    flocking = True
+    seeksGoal = False
+    navigatesTerrain = False
+    
+    def __init__(self, pos, herd=None, rng=None):
+        super().__init__(species="Penguin", pos=pos, herd=herd, rng=rng)
     
-    def update(self, boids, dt):
-        self.neighbours = self.computeNeighbours(boids)
+    def update(self, boids, terrain, dt, grid=None):
+        self.neighbourhood = self.classifyNeighbours(boids, grid)
+        self.neighbours = self.neighbourhood.visible
         for neighbour in self.neighbours:
             if self.mergeFlock(neighbour):
                 break
             
-        self.flockNeighbours = self.computeNeighbours(self.flock.members)
+        self.flockNeighbours = self.visibleFlockmates()
         
         self.updateBehaviours()    
         self.updateAcceleration()
         self.updateVelocity(dt)
-        self.updatePosition(dt)
+        self.updatePosition(terrain, dt)
     
     def updateBehaviours(self):
         """Update the boid's behaviours based on its current state."""
         self.netForce = self.navigator()
         
     def navigator(self):
-        acc = np.array([0, 0], dtype=float)
+        acc = [0.0, 0.0]
         mag = 0
         
         # mag = accumulate(acc, self.avoidObstacles())
@@ -480,51 +684,149 @@ class Penguin(Boid):
         # if mag < 1:
         #     mag = accumulate(acc, self.gotoGoal())    
         
-        acc *= behaviours[self.species]["max-acceleration"][4]*self.mass  # Scale by max acceleration * mass
-        return acc
+        return vec2.scale(acc, speciesParams(self.species).maxAcceleration*self.mass)  # Scale by max acceleration * mass
 
 
 # FLOCK CLASS
 class Flock:
-    def __init__(self, species, members):
-        self.members = list(members)  # Create a copy to avoid reference issues
+    """
+    A flock is one set in a disjoint-set forest of Flock nodes.
+
+    Merging links the smaller flock's root under the larger one's (union by
+    size), and boids find their flock's root with path compression, so a
+    merge never touches the members. The root keeps the exact number of live
+    members for the herd-size cap. A boid that leaves just decrements its
+    root's size and starts a new singleton flock; its old node stays in the
+    tree for the members still linked through it.
+
+    In herds with flockSums set (a world with flockAggregates sets it on
+    its flocking herds), the root also keeps running sums of its members'
+    positions and velocities, as vec2 tuples, so the flock's centroid and
+    heading are O(1) reads. Joins, leaves and merges update them exactly;
+    the scalar engine shifts them per boid as it moves, and
+    World.shiftFlocks() adds each flock's bulk moves once per tick. Other
+    herds keep no sums at all, and centroid() and heading() raise.
+    """
+    def __init__(self, species, members=()):
         self.species = species
-        self.size = len(self.members)
-        
-        # Set flock reference for all members
-        for member in self.members:
-            member.flock = self
+        self.parent = self
+        # live members and their summed state, only meaningful on a root
+        self.size = 0
+        self.sumPosition = (0.0, 0.0)
+        self.sumVelocity = (0.0, 0.0)
+        self.herd = None
+        
+        for member in members:
+            self.attach(member)
+    
+    def find(self):
+        """Root of this flock's tree, compressing the path to it."""
+        root = self
+        while root.parent is not root:
+            root = root.parent
+        node = self
+        while node.parent is not root:
+            node.parent, node = root, node.parent
+        return root
+    
+    def union(self, other):
+        """Merges two flocks. Returns the root of the combined flock."""
+        root, otherRoot = self.find(), other.find()
+        if root is otherRoot:
+            return root
+        if root.size < otherRoot.size:
+            root, otherRoot = otherRoot, root
+        otherRoot.parent = root
+        root.size += otherRoot.size
+        if root.keepsSums():
+            root.sumPosition = vec2.add(root.sumPosition, otherRoot.sumPosition)
+            root.sumVelocity = vec2.add(root.sumVelocity, otherRoot.sumVelocity)
+        return root
+    
+    def keepsSums(self):
+        """Whether this flock keeps running sums (its herd has flockSums set)."""
+        return self.herd is not None and self.herd.flockSums
+    
+    def attach(self, boid):
+        """Moves a boid into this flock without checking the herd-size cap."""
+        root = self.find()
+        root.herd = root.herd or boid.herd
+        sums = boid.herd.flockSums
+        if sums:
+            position, velocity = vec2.vec(boid.position), vec2.vec(boid.velocity)
+        if boid._flock is not None:
+            previous = boid.flock
+            previous.size -= 1
+            if sums:
+                previous.sumPosition = vec2.sub(previous.sumPosition, position)
+                previous.sumVelocity = vec2.sub(previous.sumVelocity, velocity)
+        boid._flock = root
+        root.size += 1
+        if sums:
+            root.sumPosition = vec2.add(root.sumPosition, position)
+            root.sumVelocity = vec2.add(root.sumVelocity, velocity)
+    
+    def shift(self, dPosition=None, dVelocity=None):
+        """Applies a member's change in position and/or velocity to the flock sums."""
+        root = self.find()
+        if dPosition is not None:
+            root.sumPosition = vec2.add(root.sumPosition, dPosition)
+        if dVelocity is not None:
+            root.sumVelocity = vec2.add(root.sumVelocity, dVelocity)
+    
+    def centroid(self):
+        root = self.requireSums()
+        return vec2.scale(root.sumPosition, 1/root.size)
+    
+    def heading(self):
+        """Mean velocity of the flock's members."""
+        root = self.requireSums()
+        return vec2.scale(root.sumVelocity, 1/root.size)
+    
+    def requireSums(self):
+        root = self.find()
+        if not root.keepsSums():
+            raise RuntimeError(f"{self.species} flocks keep no running sums; create the world with flockAggregates")
+        return root
+    
+    @property
+    def members(self):
+        """Boids currently in this flock. Scans the herd, so avoid it in per-tick code."""
+        root = self.find()
+        if root.herd is None:
+            return []
+        return [boid for boid in root.herd.boids if boid.flock is root]
         
     def add_member(self, boid):
         """Add a boid to the flock."""
-        max_size = behaviours[self.species]["herd-size"][4]
-        if self.size < max_size and boid not in self.members:
-            self.members.append(boid)
-            self.size = len(self.members)  # Update size based on actual list length
-            boid.flock = self
+        root = self.find()
+        max_size = speciesParams(self.species).herdSize
+        if root.size < max_size and boid.flock is not root:
+            root.attach(boid)
             return True
         return False
     
     def remove_member(self, boid):
-        """Remove a boid from the flock."""
-        if boid in self.members:
-            self.members.remove(boid)
-            self.size = len(self.members)  # Update size based on actual list length
+        """Remove a boid from the flock. It becomes a flock of its own."""
+        if boid.flock is self.find():
+            Flock(species=self.species, members=[boid])
             return True
         return False
     
+    @staticmethod
+    def regroup(species, boids, labels):
+        """Rebuilds the flocks of a herd's boids from scratch, one new flock per distinct label."""
+        flocks = {}
+        for boid, label in zip(boids, labels.tolist()):
+            if label not in flocks:
+                flocks[label] = Flock(species)
+            boid._flock = None
+            flocks[label].attach(boid)
+    
     def limitFlockSize(self):
-        maxHerdSize = behaviours[self.species]["herd-size"][4]
-        if self.size > maxHerdSize:
-            # Keep first maxHerdSize members
-            staying = self.members[:maxHerdSize]
-            leaving = self.members[maxHerdSize:]
-            
-            # Update current flock to only have staying members
-            self.members = staying
-            self.size = len(staying)
-            
-            # Create individual flocks for leaving members
-            for animal in leaving:
-                new_flock = Flock(species=self.species, members=[animal])
-                animal.flock = new_flock
\ No newline at end of file
+        root = self.find()
+        maxHerdSize = speciesParams(self.species).herdSize
+        if root.size > maxHerdSize:
+            # Keep first maxHerdSize members, the rest get individual flocks
+            for animal in root.members[maxHerdSize:]:
+                root.remove_member(animal)
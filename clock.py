@@ -0,0 +1,65 @@
+import contextlib
+import time
+
+
+class FixedTimestep:
+    """
+    Accumulator-based fixed-timestep scheduler.
+
+    Wall-clock frame time (scaled by the playback speed) is banked in an
+    accumulator and paid out in whole ticks of dt, so the physics always
+    steps with the same dt regardless of frame rate or speed. At most
+    maxSubsteps ticks run per frame; time beyond that is dropped, so one
+    slow frame can't snowball into ever longer frames.
+    """
+    def __init__(self, dt=1/60, maxSubsteps=8):
+        assert dt > 0, "Timestep must be positive."
+        assert maxSubsteps >= 1, "At least one substep per frame is needed."
+        self.dt = dt
+        self.maxSubsteps = maxSubsteps
+        self.accumulator = 0.0
+        self.droppedTime = 0.0  # simulated time skipped because of the substep cap
+
+    def advance(self, frameTime, speed=1):
+        """Banks one frame's time and returns how many ticks to run this frame."""
+        self.accumulator += max(frameTime, 0)*speed
+        steps = int(self.accumulator // self.dt)
+        if steps > self.maxSubsteps:
+            self.droppedTime += (steps - self.maxSubsteps)*self.dt
+            steps = self.maxSubsteps
+        self.accumulator -= steps*self.dt
+        if self.accumulator >= self.dt:
+            # only whole ticks were dropped above; keep the fractional part for interpolation
+            self.accumulator %= self.dt
+        return steps
+
+    def alpha(self):
+        """Fraction of a tick banked but not yet simulated, used to interpolate rendering."""
+        return min(self.accumulator / self.dt, 1.0)
+
+    def reset(self):
+        self.accumulator = 0.0
+
+
+class PhaseTimer:
+    """Accumulates wall-clock time spent in each named phase of a frame or tick."""
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] = self.totals.get(name, 0.0) + time.perf_counter() - t0
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def averages(self):
+        """Mean seconds per call of each phase."""
+        return {name: total/self.counts[name] for name, total in self.totals.items()}
+
+    def reset(self):
+        self.totals = {}
+        self.counts = {}
@@ -0,0 +1,94 @@
+import copy
+import time
+
+from recording import Recorder
+from terrain import Terrain, canvasMultiplier
+from world import World
+
+# A scenario describes everything needed to rebuild a run without the UI
+default_scenario = {
+    "heightmap": None,          # greyscale heightmap path, None for flat terrain
+    "terrain-size": "small",    # "small" or "large", as in the app
+    "terrain-type": "Grass",
+    "levels": 15,
+    "invert": True,
+    "border-mode": "Bounce",
+    "spawn": {"Sheep": 100},    # species -> number of boids
+    "dt": 1/60,
+    "seed": 0,
+    "vectorized": True,
+    "flock-aggregates": False,  # cohesion and alignment from whole-flock sums, for huge herds
+    "verlet-skin": None,        # px of slack for cached neighbour lists, None to search every tick
+    "jit": False,               # compiled flocking kernels, if Numba is installed
+    "workers": 1,               # processes sharing the vectorized step, one per tile of the world
+}
+
+
+class Simulation:
+    """
+    Tk-free simulation core: a World on a loaded terrain, stepped with a fixed dt.
+
+    Used for batch runs and benchmarks on machines without a display.
+    """
+    def __init__(self, terrain, dt=1/60, borderMode="Bounce", vectorized=True, seed=None, flockAggregates=False,
+                 verletSkin=None, jit=False, workers=1):
+        self.terrain = terrain
+        self.dt = dt
+        self.world = World(terrain, borderMode=borderMode, vectorized=vectorized, flockAggregates=flockAggregates,
+                           verletSkin=verletSkin, jit=jit, workers=workers, seed=seed)
+        self.tick = 0
+        self.recorder = None
+
+    @classmethod
+    def fromScenario(cls, scenario):
+        """Builds a simulation from a scenario dict, see default_scenario for the keys."""
+        settings = copy.deepcopy(default_scenario)
+        settings.update(scenario)
+
+        size = int(256*canvasMultiplier[settings["terrain-size"]])
+        terrain = Terrain(size, size, invert=settings["invert"])
+        terrain.load(settings["heightmap"], settings["terrain-type"], levels=settings["levels"])
+
+        sim = cls(terrain, dt=settings["dt"], borderMode=settings["border-mode"],
+                  vectorized=settings["vectorized"], seed=settings["seed"],
+                  flockAggregates=settings["flock-aggregates"], verletSkin=settings["verlet-skin"],
+                  jit=settings["jit"], workers=settings["workers"])
+        for species, n in settings["spawn"].items():
+            sim.spawn(species, n)
+        return sim
+
+    def boidCount(self):
+        return sum(len(herd) for herd in self.world.herds.values())
+
+    def spawn(self, species, n, margin=16):
+        """Spawns n boids of a species at uniformly random positions on the terrain."""
+        w, h = self.world.width, self.world.height
+        positions = self.world.rng.uniform((margin, margin), (w - margin, h - margin), size=(n, 2))
+        return self.world.spawnBatch(species, positions)
+
+    def record(self, path, append=False):
+        """
+        Streams every following tick to a recording, see recording.py. With
+        append, the ticks carry on from the end of the existing recording.
+        """
+        self.recorder = Recorder(path, self.world, self.dt, append=append)
+
+    def step(self, steps=1):
+        for _ in range(steps):
+            self.world.step(self.dt)
+            self.tick += 1
+            if self.recorder:
+                self.recorder.record(self.world, self.tick)
+
+    def close(self):
+        """Finishes the recording and stops the world's worker processes, if any."""
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+        self.world.close()
+
+    def run(self, steps):
+        """Steps as fast as possible. Returns the wall-clock time taken in seconds."""
+        t0 = time.perf_counter()
+        self.step(steps)
+        return time.perf_counter() - t0
@@ -0,0 +1,268 @@
+import numpy as np
+
+
+class HerdField:
+    """Exposes one row of a Herd array as an attribute of the boid stored at that row."""
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, boid, owner=None):
+        if boid is None:
+            return self
+        value = getattr(boid.herd, self.name)[boid.index]
+        # vector fields are returned as writable row views, scalar fields as python numbers
+        return value if isinstance(value, np.ndarray) else value.item()
+
+    def __set__(self, boid, value):
+        getattr(boid.herd, self.name)[boid.index] = value
+
+
+class Herd:
+    """
+    Structure-of-arrays state for every boid of one species.
+
+    Each field is a contiguous array with one row per boid, so the flocking
+    rules can run as whole-array kernels. Boid objects only keep their row
+    index and read and write their state through HerdField descriptors.
+    """
+    # field name -> (shape of one row, dtype)
+    fields = {
+        "position": ((2,), float),
+        "prevPosition": ((2,), float),  # position before the last tick, for render interpolation
+        "velocity": ((2,), float),
+        "acceleration": ((2,), float),
+        "netForce": ((2,), float),
+        "origin": ((2,), float),
+        "goal": ((2,), float),
+        "hasGoal": ((), bool),
+        "time_alive": ((), float),
+        "mass": ((), float),
+        "size": ((), int),
+        "hasVisableNeighbours": ((), bool),
+    }
+
+    def __init__(self, species, capacity=16):
+        self.species = species
+        self.flockSums = False    # whether its flocks keep running sums, see boid.Flock
+        self.count = 0
+        self.boids = []
+        self.buffers = {name: np.zeros((capacity, *shape), dtype=dtype) for name, (shape, dtype) in self.fields.items()}
+        self.exposeFields()
+
+    def __len__(self):
+        return self.count
+
+    def exposeFields(self):
+        """Point each field attribute at the live rows of its buffer."""
+        for name, buffer in self.buffers.items():
+            setattr(self, name, buffer[:self.count])
+
+    def reserve(self, capacity):
+        """Grow every buffer so it can hold at least capacity boids."""
+        current = len(self.buffers["position"])
+        if capacity <= current:
+            return
+        capacity = max(capacity, 2*current)
+        for name, buffer in self.buffers.items():
+            grown = np.zeros((capacity, *buffer.shape[1:]), dtype=buffer.dtype)
+            grown[:self.count] = buffer[:self.count]
+            self.buffers[name] = grown
+        self.exposeFields()
+
+    def append(self, boid, **state):
+        """Adds a boid to the herd, initialising its row from state. Returns its row index."""
+        self.reserve(self.count + 1)
+        state.setdefault("prevPosition", state.get("position", 0))
+        index = self.count
+        for name, buffer in self.buffers.items():
+            buffer[index] = state.get(name, 0)
+        self.count += 1
+        self.boids.append(boid)
+        self.exposeFields()
+        return index
+
+    def extend(self, boids, **state):
+        """
+        Adds several boids at once. Each state value is broadcast over their
+        rows, so it may be one value for all of them or one row per boid.
+        Returns the row index of the first.
+        """
+        start = self.count
+        self.reserve(start + len(boids))
+        state.setdefault("prevPosition", state.get("position", 0))
+        rows = slice(start, start + len(boids))
+        for name, buffer in self.buffers.items():
+            buffer[rows] = state.get(name, 0)
+        self.count += len(boids)
+        self.boids.extend(boids)
+        self.exposeFields()
+        return start
+
+    def truncate(self, count):
+        """Drops every boid after the first count, i.e. the most recently spawned."""
+        if count < self.count:
+            del self.boids[count:]
+            self.count = count
+            self.exposeFields()
+
+
+#### VECTORIZED KERNELS ###############################################
+# Each kernel mirrors the Boid method of the same name, applied to every row at once.
+
+def rowSsq(v):
+    """Squared magnitude of every row of an Nx2 array."""
+    return v[:, 0]*v[:, 0] + v[:, 1]*v[:, 1]
+
+def unitRows(v):
+    """Unit vector of every row of an Nx2 array. Zero rows stay zero."""
+    mag = np.sqrt(rowSsq(v))
+    out = np.zeros_like(v)
+    nonzero = mag > 0
+    out[nonzero] = v[nonzero] / mag[nonzero, None]
+    return out
+
+def clampUnit(v):
+    """Rescales the rows of v longer than 1 to unit length, in place."""
+    ssq = rowSsq(v)
+    over = ssq > 1
+    v[over] /= np.sqrt(ssq[over])[:, None]
+    return v
+
+def sumRows(values, rows, n):
+    """Sums the rows of values into n bins given by rows."""
+    out = np.zeros((n, 2), dtype=float)
+    out[:, 0] = np.bincount(rows, weights=values[:, 0], minlength=n)
+    out[:, 1] = np.bincount(rows, weights=values[:, 1], minlength=n)
+    return out
+
+def inViewCone(velocity, r, cosViewAngle):
+    """
+    Boolean mask of the offsets r that lie inside the view cone around
+    velocity, given the cosine of the view angle. Same test as vec2.inViewCone.
+    """
+    d = np.einsum("ij,ij->i", velocity, r)
+    limit = cosViewAngle*cosViewAngle*rowSsq(velocity)*rowSsq(r)
+    if cosViewAngle > 0:
+        return (d > 0) & (d*d >= limit)
+    return (d >= 0) | (d*d <= limit)
+
+def keepDistance(dist, mag2, rows, n, comfortZone, dangerZone):
+    """
+    dist and mag2 hold the offset and squared distance to each visible
+    neighbour of the boid in the matching entry of rows.
+    """
+    comfortZone2 = comfortZone**2
+    dangerZone2 = dangerZone**2
+    close = (mag2 < comfortZone2) & (mag2 > 0)
+    with np.errstate(divide="ignore"):
+        pushStrength = np.minimum((comfortZone2 - mag2[close]) / (comfortZone2 - dangerZone2), 1)
+    change = -sumRows(dist[close]*(pushStrength/np.sqrt(mag2[close]))[:, None], rows[close], n)
+    return clampUnit(change)
+
+def flockAverage(values, rows, n):
+    """Average of values over each boid's flock neighbours, and the neighbour counts."""
+    counts = np.bincount(rows, minlength=n)
+    total = sumRows(values, rows, n)
+    hasNeighbours = counts > 0
+    total[hasNeighbours] /= counts[hasNeighbours, None]
+    return total, hasNeighbours
+
+def matchHeading(velocity, avgVelocity, hasNeighbours, maxVelocity):
+    change = np.zeros_like(velocity)
+    change[hasNeighbours] = (avgVelocity[hasNeighbours] - velocity[hasNeighbours])/(maxVelocity/2)
+    return clampUnit(change)
+
+def steerToCenter(centerOffset, hasNeighbours):
+    """centerOffset is the mean offset from each boid to its flockmates."""
+    change = np.zeros_like(centerOffset)
+    change[hasNeighbours] = centerOffset[hasNeighbours]/50
+    return clampUnit(change)
+
+def gotoGoal(position, velocity, goal, hasGoal, cruisingSpeed, maxVelocity):
+    desiredVelocity = goal - position
+    tooFast = rowSsq(desiredVelocity) > cruisingSpeed
+    desiredVelocity[tooFast] = unitRows(desiredVelocity[tooFast])*cruisingSpeed
+    change = clampUnit((desiredVelocity - velocity)/(maxVelocity/2))
+    change[~hasGoal] = 0
+    return change
+
+def accumulate(acc, mag, vectorToAdd):
+    """
+    Vectorized boid.accumulate: adds vectorToAdd to the rows of acc that still
+    have budget (mag < 1), truncating at unit length. Updates acc and mag in place.
+    """
+    active = mag < 1
+    temp = acc + vectorToAdd
+    fits = active & (rowSsq(temp) <= 1)
+    acc[fits] = temp[fits]
+    mag[fits] = np.sqrt(rowSsq(temp[fits]))
+
+    overflow = active & ~fits
+    if overflow.any():
+        add = vectorToAdd[overflow]
+        a = rowSsq(add)
+        b = 2*np.einsum("ij,ij->i", acc[overflow], add)
+        c = rowSsq(acc[overflow]) - 1
+        t = (-b + np.sqrt(b**2 - 4*a*c)) / (2*a)
+        acc[overflow] += t[:, None]*add
+        mag[overflow] = 1
+
+def terrainIndices(terrain, position):
+    """Pixel (y, x) under each position, clamped to the edge of the terrain."""
+    h, w = terrain.gradientField.shape[:2]
+    x = np.clip(position[:, 0].astype(int), 0, w - 1)
+    y = np.clip(position[:, 1].astype(int), 0, h - 1)
+    return y, x
+
+def navigateTerrain(velocity, grad, dragFactor):
+    """
+    Drag force opposing motion along the slope. Downhill drag is a fifth of
+    uphill drag. dragFactor may be a scalar or one value per boid.
+    """
+    slope = np.sqrt(rowSsq(grad))
+    vdotg = np.einsum("ij,ij->i", velocity, grad)
+    drag = np.where(vdotg > 0, dragFactor, np.divide(dragFactor, 5))
+    force = np.zeros_like(velocity)
+    sloped = slope > 0
+    force[sloped] = (-drag[sloped]*vdotg[sloped]/slope[sloped])[:, None]*grad[sloped]
+    return force
+
+def updateVelocity(velocity, acceleration, dt, maxVelocity):
+    velocity += acceleration*dt
+    tooFast = rowSsq(velocity) > maxVelocity**2
+    velocity[tooFast] = unitRows(velocity[tooFast])*maxVelocity
+
+def updatePosition(position, velocity, grad, terrainSpeed, dt):
+    gradVelocityComponent = np.einsum("ij,ij->i", unitRows(velocity), grad)
+    slopeCorrectionFactor = 1/np.sqrt(gradVelocityComponent**2 + 1)
+    position += (terrainSpeed*slopeCorrectionFactor)[:, None]*velocity*dt
+
+def spiral(herd, dt):
+    """Vectorized Boid.update: Archimedean spiral around each boid's origin."""
+    herd.time_alive += dt
+    t = herd.time_alive
+    r = 2*t
+    herd.position[:, 0] = herd.origin[:, 0] + r*np.cos(t)
+    herd.position[:, 1] = herd.origin[:, 1] + r*np.sin(t)
+
+def handleBorder(herd, borderType, w, h):
+    position = herd.position
+    velocity = herd.velocity
+    halfSize = herd.size/2
+    if borderType == "Wrap":
+        position[:, 0] %= w
+        position[:, 1] %= h
+    elif borderType == "Bounce":
+        #x coords
+        hitLeft = (position[:, 0] - halfSize <= 0) & (velocity[:, 0] < 0)
+        hitRight = (position[:, 0] + halfSize >= w) & (velocity[:, 0] > 0)
+        hit = hitLeft | hitRight
+        position[hit, 0] = np.where(hitLeft, halfSize, w - halfSize)[hit]
+        velocity[hit, 0] *= -1
+
+        #y coords
+        hitBottom = (position[:, 1] + halfSize >= h) & (velocity[:, 1] > 0)
+        hitTop = (position[:, 1] - halfSize <= 0) & (velocity[:, 1] < 0)
+        hit = hitBottom | hitTop
+        position[hit, 1] = np.where(hitTop, halfSize, h - halfSize)[hit]
+        velocity[hit, 1] *= -1
@@ -0,0 +1,143 @@
+"""
+Numba-compiled flocking kernels for the vectorized engine.
+
+flockStep fuses the steps of herd.py's kernels into one compiled pass
+over a herd's arrays: keepDistance, matchHeading, steerToCenter and
+gotoGoal under the accumulate budget, then terrain drag and integration.
+The NumPy kernels need a temporary array and a masked pass per rule. Numba
+is optional: without it `available` is False and World keeps using herd.py.
+"""
+import math
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+available = numba is not None
+
+
+def jit(function):
+    # error_model="numpy" keeps NumPy's float semantics, e.g. x/0 -> inf instead of raising
+    return numba.njit(cache=True, error_model="numpy")(function) if available else function
+
+
+@jit
+def clampUnit(x, y):
+    ssq = x*x + y*y
+    if ssq > 1:
+        mag = math.sqrt(ssq)
+        return x/mag, y/mag
+    return x, y
+
+
+@jit
+def accumulate(accX, accY, mag, x, y):
+    """herd.accumulate for one boid. Returns the new accumulator and its magnitude."""
+    if mag >= 1:
+        return accX, accY, mag
+    tempX, tempY = accX + x, accY + y
+    tempSsq = tempX*tempX + tempY*tempY
+    if tempSsq <= 1:
+        return tempX, tempY, math.sqrt(tempSsq)
+    a = x*x + y*y
+    b = 2*(accX*x + accY*y)
+    c = accX*accX + accY*accY - 1
+    t = (-b + math.sqrt(b*b - 4*a*c)) / (2*a)
+    return accX + t*x, accY + t*y, 1.0
+
+
+@jit
+def flockStep(position, velocity, mass, netForce, acceleration, goal, hasGoal, seeksGoal,
+              starts, dist, mag2, neighbourVelocity, inFlock, useAggregates, aggVelocity, aggCenterOffset,
+              grad, terrainSpeed, dragFactor, navigatesTerrain,
+              comfortZone, dangerZone, maxVelocity, cruisingSpeed, maxAcceleration, dt):
+    """
+    Steps every boid of a flocking herd in place. The visible neighbour
+    pairs of boid k are entries starts[k]:starts[k+1] of dist, mag2,
+    neighbourVelocity and inFlock (whether the neighbour is a flockmate).
+    With useAggregates, alignment and cohesion use aggVelocity and
+    aggCenterOffset instead of the flockmate pairs.
+    """
+    comfortZone2 = comfortZone*comfortZone
+    dangerZone2 = dangerZone*dangerZone
+    halfMaxVelocity = maxVelocity/2
+    for k in range(len(position)):
+        px, py = position[k, 0], position[k, 1]
+        vx, vy = velocity[k, 0], velocity[k, 1]
+
+        # one pass over the neighbours: separation and flockmate sums
+        sepX = sepY = 0.0
+        sumVX = sumVY = sumDX = sumDY = 0.0
+        flockmates = 0
+        for p in range(starts[k], starts[k + 1]):
+            d2 = mag2[p]
+            if 0 < d2 < comfortZone2:
+                push = min((comfortZone2 - d2) / (comfortZone2 - dangerZone2), 1.0)/math.sqrt(d2)
+                sepX -= dist[p, 0]*push
+                sepY -= dist[p, 1]*push
+            if inFlock[p]:
+                flockmates += 1
+                sumVX += neighbourVelocity[p, 0]
+                sumVY += neighbourVelocity[p, 1]
+                sumDX += dist[p, 0]
+                sumDY += dist[p, 1]
+
+        accX = accY = mag = 0.0
+        x, y = clampUnit(sepX, sepY)
+        accX, accY, mag = accumulate(accX, accY, mag, x, y)
+
+        if flockmates > 0:
+            if useAggregates:
+                avgVX, avgVY = aggVelocity[k, 0], aggVelocity[k, 1]
+                centerX, centerY = aggCenterOffset[k, 0], aggCenterOffset[k, 1]
+            else:
+                avgVX, avgVY = sumVX/flockmates, sumVY/flockmates
+                centerX, centerY = sumDX/flockmates, sumDY/flockmates
+            x, y = clampUnit((avgVX - vx)/halfMaxVelocity, (avgVY - vy)/halfMaxVelocity)
+            accX, accY, mag = accumulate(accX, accY, mag, x, y)
+            x, y = clampUnit(centerX/50, centerY/50)
+            accX, accY, mag = accumulate(accX, accY, mag, x, y)
+
+        if seeksGoal:
+            x = y = 0.0
+            if hasGoal[k]:
+                desiredX, desiredY = goal[k, 0] - px, goal[k, 1] - py
+                desiredSsq = desiredX*desiredX + desiredY*desiredY
+                if desiredSsq > cruisingSpeed:
+                    desiredMag = math.sqrt(desiredSsq)
+                    desiredX, desiredY = desiredX/desiredMag*cruisingSpeed, desiredY/desiredMag*cruisingSpeed
+                x, y = clampUnit((desiredX - vx)/halfMaxVelocity, (desiredY - vy)/halfMaxVelocity)
+            accX, accY, mag = accumulate(accX, accY, mag, x, y)
+
+        m = mass[k]
+        forceX, forceY = accX*(maxAcceleration*m), accY*(maxAcceleration*m)
+
+        # terrain drag opposing motion along the slope, a fifth as strong downhill
+        gx, gy = grad[k, 0], grad[k, 1]
+        if navigatesTerrain:
+            slope = math.sqrt(gx*gx + gy*gy)
+            if slope > 0:
+                vdotg = vx*gx + vy*gy
+                drag = dragFactor[k] if vdotg > 0 else dragFactor[k]/5
+                forceX += -drag*vdotg/slope*gx
+                forceY += -drag*vdotg/slope*gy
+        netForce[k, 0], netForce[k, 1] = forceX, forceY
+        ax, ay = forceX/m, forceY/m
+        acceleration[k, 0], acceleration[k, 1] = ax, ay
+
+        # integrate
+        vx += ax*dt
+        vy += ay*dt
+        speed2 = vx*vx + vy*vy
+        if speed2 > maxVelocity*maxVelocity:
+            speed = math.sqrt(speed2)
+            vx, vy = vx/speed*maxVelocity, vy/speed*maxVelocity
+        velocity[k, 0], velocity[k, 1] = vx, vy
+
+        speed = math.sqrt(vx*vx + vy*vy)
+        gradVelocityComponent = (vx/speed)*gx + (vy/speed)*gy if speed > 0 else 0.0
+        slopeCorrectionFactor = 1/math.sqrt(gradVelocityComponent*gradVelocityComponent + 1)
+        step = terrainSpeed[k]*slopeCorrectionFactor*dt
+        position[k, 0] = px + vx*step
+        position[k, 1] = py + vy*step
@@ -0,0 +1,177 @@
+"""
+Ring buffer of recent world states, for rewinding.
+
+Every `stride` ticks, History.record stores each boid's position,
+velocity, time alive and flock. Values are quantized to fixed steps
+(see History.resolution). Every `keyframeInterval`-th record, and every
+record where a herd's size changed, is a keyframe holding the quantized
+values. The others hold only the change since the previous record, which
+is usually a few units and fits in int8. Each array is stored in the
+smallest integer type that holds it and zlib-compressed. Once the buffer
+grows past maxBytes, the oldest keyframe and its deltas are dropped, so
+memory stays bounded however long the run is (only the newest keyframe's
+group is always kept, whatever its size). Deltas come to about
+3 bytes per boid per record, so the defaults keep 10 minutes of 5,000
+boids in roughly 90 MB.
+
+History.restore puts the world back to a recorded tick. It decodes the
+keyframe at or before that tick plus at most keyframeInterval - 1 deltas.
+Restored states are quantized, so a run continued from one drifts away
+from the original run.
+"""
+import bisect
+import collections
+import zlib
+
+import numpy as np
+
+from boid import Flock
+from world import flockLabels
+
+
+def encode(values):
+    """An int64 array as (dtype, shape, compressed bytes), in the smallest integer type that holds it."""
+    if len(values):
+        dtype = np.result_type(np.min_scalar_type(values.min()), np.min_scalar_type(values.max()))
+    else:
+        dtype = np.dtype(np.int8)
+    return dtype.str, values.shape, zlib.compress(values.astype(dtype).tobytes(), 1)
+
+
+def decode(encoded):
+    dtype, shape, data = encoded
+    return np.frombuffer(zlib.decompress(data), dtype=dtype).reshape(shape).astype(np.int64)
+
+
+class Record:
+    """One recorded tick: a herd size per species and the encoded arrays, whole or as deltas."""
+    __slots__ = ("tick", "counts", "keyframe", "arrays", "nbytes")
+
+    def __init__(self, tick, counts, keyframe, arrays):
+        self.tick = tick
+        self.counts = counts
+        self.keyframe = keyframe
+        self.arrays = arrays
+        self.nbytes = sum(len(data) for _, _, data in arrays.values())
+
+
+class History:
+    """Recent states of a world, recorded every stride ticks, within maxBytes."""
+    # quantization step of each recorded Herd field, in its own units
+    resolution = {
+        "position": 1/16,     # px
+        "velocity": 1/16,     # px/s
+        "time_alive": 1/1024, # s
+    }
+
+    def __init__(self, stride=6, keyframeInterval=30, maxBytes=128*2**20):
+        self.stride = stride
+        self.keyframeInterval = keyframeInterval
+        self.maxBytes = maxBytes
+        self.records = collections.deque()
+        self.nbytes = 0
+        self.keyframes = 0        # keyframes in records; the oldest record is always one
+        self.previous = None      # quantized values of the newest record, the base for the next delta
+        self.sinceKeyframe = 0
+        self.decoded = {}         # tick -> quantized values, for the keyframe group last restored from
+
+    def __len__(self):
+        return len(self.records)
+
+    def oldestTick(self):
+        return self.records[0].tick if self.records else None
+
+    def newestTick(self):
+        return self.records[-1].tick if self.records else None
+
+    def quantize(self, world):
+        values = {name: np.concatenate([np.rint(getattr(herd, name)/step).astype(np.int64)
+                                        for herd in world.herds.values()])
+                  for name, step in self.resolution.items()}
+        values["flock"] = np.concatenate([flockLabels(herd)[1].astype(np.int64) for herd in world.herds.values()])
+        return values
+
+    def record(self, world, tick):
+        """Records the world as of tick, if tick falls on the stride."""
+        if tick % self.stride:
+            return
+        counts = tuple(len(herd) for herd in world.herds.values())
+        values = self.quantize(world)
+        keyframe = (self.previous is None or counts != self.records[-1].counts
+                    or self.sinceKeyframe + 1 >= self.keyframeInterval)
+        if keyframe:
+            arrays = {name: encode(array) for name, array in values.items()}
+            self.sinceKeyframe = 0
+        else:
+            arrays = {name: encode(array - self.previous[name]) for name, array in values.items()}
+            self.sinceKeyframe += 1
+        record = Record(tick, counts, keyframe, arrays)
+        self.records.append(record)
+        self.nbytes += record.nbytes
+        self.keyframes += keyframe
+        self.previous = values
+
+        # drop the oldest keyframe with its deltas, which can't be decoded without it. The group
+        # holding the newest record is never dropped, even if it alone is over maxBytes
+        while self.nbytes > self.maxBytes and self.keyframes > 1:
+            self.dropOldest()
+            while not self.records[0].keyframe:
+                self.dropOldest()
+
+    def dropOldest(self):
+        record = self.records.popleft()
+        self.nbytes -= record.nbytes
+        self.keyframes -= record.keyframe
+        self.decoded.pop(record.tick, None)
+
+    def truncate(self, tick):
+        """Forgets every record after tick, e.g. when the run continues from a rewound state."""
+        while self.records and self.records[-1].tick > tick:
+            record = self.records.pop()
+            self.nbytes -= record.nbytes
+            self.keyframes -= record.keyframe
+            self.decoded.pop(record.tick, None)
+        self.previous = None  # the next record starts a new keyframe
+
+    def values(self, index):
+        """Decoded quantized values of the record at index, from its keyframe on."""
+        start = index
+        while not self.records[start].keyframe:
+            start -= 1
+        if self.records[start].tick not in self.decoded:
+            self.decoded = {}
+        values = None
+        for k in range(start, index + 1):
+            record = self.records[k]
+            if record.tick in self.decoded:
+                values = self.decoded[record.tick]
+                continue
+            arrays = {name: decode(encoded) for name, encoded in record.arrays.items()}
+            values = arrays if record.keyframe else {name: values[name] + arrays[name] for name in arrays}
+            self.decoded[record.tick] = values
+        return values
+
+    def restore(self, world, tick):
+        """
+        Puts the world back to the newest record at or before tick. Boids
+        spawned since then are removed. Returns the tick restored to, or
+        None if nothing that old is recorded.
+        """
+        index = bisect.bisect_right([record.tick for record in self.records], tick) - 1
+        if index < 0:
+            return None
+        record = self.records[index]
+        values = self.values(index)
+
+        start = 0
+        for herd, count in zip(world.herds.values(), record.counts):
+            herd.truncate(count)
+            rows = slice(start, start + count)
+            for name, step in self.resolution.items():
+                getattr(herd, name)[:] = values[name][rows]*step
+            herd.prevPosition[:] = herd.position
+            herd.netForce[:] = 0
+            herd.acceleration[:] = 0
+            Flock.regroup(herd.species, herd.boids, values["flock"][rows])
+            start += count
+        return record.tick
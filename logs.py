@@ -0,0 +1,84 @@
+"""
+Project-wide logging, with a level per subsystem.
+
+Each module logs through getLogger(subsystem), a child of the "herdsim"
+logger. Messages are passed printf-style,
+
+    logger.debug("Spawning %s at (%s, %s)", species, x, y)
+
+so a message below its subsystem's level is dropped before any string is
+built. By default only warnings are shown. configure() (or the
+HERDSIM_LOG environment variable) takes a spec like "info,boid=debug": a
+default level, then subsystem=level overrides.
+
+Events too frequent to log one by one, like spawns, are counted instead
+with count(). dumpCounters() logs the totals on demand, and they are
+shown at the default levels.
+"""
+import collections
+import logging
+import os
+import sys
+
+root = logging.getLogger("herdsim")
+counters = collections.Counter()
+
+
+def getLogger(subsystem):
+    """The logger of a subsystem, e.g. "boid", "terrain" or "canvas"."""
+    return root.getChild(subsystem)
+
+
+def parseSpec(spec):
+    """A spec like "info,boid=debug" as (default level, {subsystem: level}), levels as logging constants."""
+    default, levels = None, {}
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        subsystem, _, level = part.rpartition("=")
+        value = logging.getLevelName(level.upper())
+        if not isinstance(value, int):
+            raise ValueError(f"Unknown log level {level!r}")
+        if subsystem:
+            levels[subsystem] = value
+        else:
+            default = value
+    return default, levels
+
+
+def configure(spec=None, stream=None):
+    """
+    Sets the default and per-subsystem levels from spec (see parseSpec),
+    falling back on $HERDSIM_LOG and then "warning", and sends the log
+    to stream (stderr by default).
+    """
+    spec = spec if spec is not None else os.environ.get("HERDSIM_LOG", "")
+    default, levels = parseSpec(spec)
+    root.setLevel(default if default is not None else logging.WARNING)
+    levels.setdefault("counters", logging.INFO)  # dumps are asked for, so shown unless turned off
+    for subsystem, level in levels.items():
+        getLogger(subsystem).setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(stream if stream is not None else sys.stderr)
+    handler.setFormatter(logging.Formatter("%(name)s %(levelname)s: %(message)s"))
+    root.addHandler(handler)
+    root.propagate = False
+
+
+def count(event, n=1):
+    """Adds n to the counter of an event, e.g. "spawn.Sheep"."""
+    counters[event] += n
+
+
+def dumpCounters(reset=False):
+    """Logs every counter (at info level, on the "counters" subsystem) and returns them as a dict."""
+    totals = dict(sorted(counters.items()))
+    logger = getLogger("counters")
+    for event, total in totals.items():
+        logger.info("%s: %d", event, total)
+    if reset:
+        counters.clear()
+    return totals
+
+
+# warnings and errors are shown even if the entry point never calls configure()
+root.setLevel(logging.WARNING)
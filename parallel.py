@@ -0,0 +1,362 @@
+"""
+Multi-process stepping for the vectorized engine.
+
+The world is cut into a grid of tiles with one worker process per tile.
+A worker owns the boids whose position falls in its tile. It also reads a
+halo of boids within neighbourhoodRadius() of its edges, so it finds
+exactly the pairs a whole-world search finds.
+
+The boids' state stays in the herds' own arrays, and is copied in and
+out of multiprocessing.shared_memory arrays that every worker maps:
+
+  publish  copies every herd's position, velocity, mass and goal into
+           the shared arrays, in world index order (O(N) per tick).
+  collect  copies the flocking herds' new state back (O(N) per tick).
+
+The herds grow, shrink and reorder their rows on their own, so they are
+not backed by the shared blocks. The terrain is shared once per loaded
+terrain: its typegrid is swapped for the shared copy, so painting writes
+straight into the block and nothing is copied per tick. Only commands and
+the visible neighbour pairs go through the pipes; the pairs are pickled,
+O(pairs) per tick.
+
+A tick runs two parallel phases around the flock bookkeeping:
+
+  search  each worker finds its owned boids' visible neighbour pairs,
+          sorted. The main process merges them into single-process order
+          and runs the flock merges and leaves, which must see every pair
+          in turn.
+  steer   each worker runs steerFlocking on its owned boids, reading each
+          boid's flock as a key, and writes the new state back.
+
+Between the two, the main process runs serially: it merges the tiles'
+sorted pairs, O(pairs log tiles), and runs the flock merges and leaves. With
+the copies, this is the part of a tick that more workers do not shorten,
+so the step only gains on a machine with a spare core per worker. The
+phases are timed in the world's PhaseTimer, see benchmarks/parallel.py.
+
+Every boid is stepped by one worker with the same pairs, in the same order,
+as World.stepFlocking, so the result is identical to the single-process
+step. Neighbour searches do not wrap around the world's borders in either
+border mode, so the halos do not wrap either.
+
+Workers are started with the "spawn" method, which re-imports the main
+module, so scripts that create them need an `if __name__ == "__main__":` guard.
+"""
+import atexit
+import math
+import traceback
+import types
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from clock import PhaseTimer
+from spatial import neighbourPairs
+from world import flockmatePairs, steerFlocking, visibleNeighbours
+
+
+def tileGrid(workers):
+    """Columns and rows of the most nearly square grid of that many tiles."""
+    rows = max(r for r in range(1, math.isqrt(workers) + 1) if workers % r == 0)
+    return workers // rows, rows
+
+
+def allocate(shape, dtype):
+    """A new shared memory block and the array over it."""
+    dtype = np.dtype(dtype)
+    block = shared_memory.SharedMemory(create=True, size=max(math.prod(shape)*dtype.itemsize, 1))
+    return block, np.ndarray(shape, dtype, buffer=block.buf)
+
+
+def attach(name, shape, dtype):
+    """Maps an existing shared memory block as an array."""
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+
+
+class ParallelStepper:
+    """
+    The main process's side of the tile workers: owns the shared arrays,
+    publishes each tick's state and gathers the workers' results. Each
+    phase is timed in timer, a clock.PhaseTimer.
+    """
+    # per-boid shared arrays, in world index order: name -> (shape of one row, dtype)
+    fields = {
+        "position": ((2,), float),
+        "velocity": ((2,), float),
+        "mass": ((), float),
+        "goal": ((2,), float),
+        "hasGoal": ((), bool),
+        "flockKey": ((), np.int64),      # id of each boid's flock after the merges
+        "avgVelocity": ((2,), float),    # whole-flock targets, with flockAggregates
+        "centerOffset": ((2,), float),
+        "newPosition": ((2,), float),    # written by the workers
+        "newVelocity": ((2,), float),
+        "netForce": ((2,), float),
+        "acceleration": ((2,), float),
+    }
+
+    def __init__(self, workers, width, height, timer=None):
+        self.cols, self.rows = tileGrid(workers)
+        self.timer = timer if timer is not None else PhaseTimer()
+        self.blocks = {}
+        self.arrays = {}
+        self.capacity = 0
+        self.terrainSource = None    # the gradient field the shared terrain was copied from
+        self.terrain = None          # the terrain whose typegrid is the shared one
+        self.pipes = []
+        self.processes = []
+        # spawn rather than fork, so workers never inherit the UI's Tk state
+        context = multiprocessing.get_context("spawn")
+        for tile in range(workers):
+            bounds = (tile % self.cols, tile // self.cols, self.cols, self.rows, width/self.cols, height/self.rows)
+            parentEnd, childEnd = context.Pipe()
+            process = context.Process(target=tileWorker, args=(childEnd, bounds), daemon=True)
+            process.start()
+            childEnd.close()
+            self.pipes.append(parentEnd)
+            self.processes.append(process)
+        atexit.register(self.close)
+
+    def command(self, *message):
+        """Sends a command to every worker and waits for all their replies."""
+        for pipe in self.pipes:
+            pipe.send(message)
+        replies = []
+        for pipe in self.pipes:
+            ok, reply = pipe.recv()
+            if not ok:
+                raise RuntimeError(f"tile worker failed:\n{reply}")
+            replies.append(reply)
+        return replies
+
+    def share(self, shapes):
+        """(Re)allocates shared arrays of the given shapes and has the workers map them."""
+        for name, (shape, dtype) in shapes.items():
+            old = self.blocks.get(name)
+            self.blocks[name], self.arrays[name] = allocate(shape, dtype)
+            if old is not None:
+                old.close()
+                old.unlink()
+        layout = {name: (block.name, self.arrays[name].shape, self.arrays[name].dtype.str)
+                  for name, block in self.blocks.items()}
+        self.command("attach", layout)
+
+    def reserve(self, n):
+        if n > self.capacity:
+            self.capacity = max(n, 2*self.capacity, 256)
+            self.share({name: ((self.capacity, *shape), dtype) for name, (shape, dtype) in self.fields.items()})
+
+    def publish(self, herds, offsets, terrain):
+        """
+        Copies the herds' state into the shared arrays, and shares the terrain
+        if it was loaded since. Returns the world-wide position and velocity
+        arrays for the snapshot.
+        """
+        with self.timer.phase("publish"):
+            n = offsets[-1]
+            self.reserve(n)
+            for herd, start, end in zip(herds, offsets[:-1], offsets[1:]):
+                for name in ("position", "velocity", "mass", "goal", "hasGoal"):
+                    self.arrays[name][start:end] = getattr(herd, name)
+            if terrain.gradientField is not self.terrainSource:
+                self.shareTerrain(terrain)
+            return self.arrays["position"][:n], self.arrays["velocity"][:n]
+
+    def shareTerrain(self, terrain):
+        """
+        Copies the terrain rasters into new shared arrays. Loading a terrain
+        replaces its gradient field, but painting edits the typegrid in place,
+        so the terrain is given the shared typegrid to paint on.
+        """
+        self.unshareTerrain()
+        self.share({"gradientField": (terrain.gradientField.shape, terrain.gradientField.dtype),
+                    "typegrid": (terrain.typegrid.shape, terrain.typegrid.dtype)})
+        self.arrays["gradientField"][:] = terrain.gradientField
+        self.arrays["typegrid"][:] = terrain.typegrid
+        terrain.typegrid = self.arrays["typegrid"]
+        self.terrainSource, self.terrain = terrain.gradientField, terrain
+
+    def unshareTerrain(self):
+        """Gives the terrain back a private typegrid, so its shared block can be freed."""
+        if self.terrain is not None:
+            self.terrain.typegrid = self.terrain.typegrid.copy()
+            self.terrain = None
+
+    def search(self, n, radius, flocking):
+        """
+        Visible neighbour pairs (i, j) of every boid in the flocking herds,
+        sorted by i and then j. flocking lists (start, end, params, cls) for
+        each flocking herd.
+        """
+        with self.timer.phase("search"):
+            parts = self.command("search", n, radius, flocking)
+        with self.timer.phase("sort"):
+            # each tile's keys i*n + j come sorted, and a stable sort merges the sorted runs
+            keys = np.sort(np.concatenate(parts), kind="stable")
+            return np.divmod(keys, max(n, 1))
+
+    def publishFlocks(self, start, end, flockKeys, avgVelocity=None, centerOffset=None):
+        self.arrays["flockKey"][start:end] = flockKeys
+        if avgVelocity is not None:
+            self.arrays["avgVelocity"][start:end] = avgVelocity
+            self.arrays["centerOffset"][start:end] = centerOffset
+
+    def steer(self, dt, useAggregates, jit):
+        """Steps every flocking boid on its tile's worker."""
+        with self.timer.phase("steer"):
+            self.command("steer", dt, useAggregates, jit)
+
+    def collect(self, herd, start, end):
+        """Copies a flocking herd's new state back from the shared arrays."""
+        with self.timer.phase("collect"):
+            herd.position[:] = self.arrays["newPosition"][start:end]
+            herd.velocity[:] = self.arrays["newVelocity"][start:end]
+            herd.netForce[:] = self.arrays["netForce"][start:end]
+            herd.acceleration[:] = self.arrays["acceleration"][start:end]
+
+    def close(self):
+        """Stops the workers and frees the shared memory. Safe to call more than once."""
+        for pipe, process in zip(self.pipes, self.processes):
+            if process.is_alive():
+                try:
+                    pipe.send(("close",))
+                except (BrokenPipeError, OSError):
+                    pass
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+            pipe.close()
+        self.pipes, self.processes = [], []
+        self.unshareTerrain()
+        self.terrainSource = None
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+        atexit.unregister(self.close)
+
+
+class TileRows:
+    """The rows of a flocking herd that one tile owns, gathered from the shared arrays for steerFlocking."""
+    def __init__(self, arrays, rows):
+        self.position = arrays["position"][rows]
+        self.velocity = arrays["velocity"][rows]
+        self.mass = arrays["mass"][rows]
+        self.goal = arrays["goal"][rows]
+        self.hasGoal = arrays["hasGoal"][rows]
+        self.netForce = np.zeros((len(rows), 2), dtype=float)
+        self.acceleration = np.zeros((len(rows), 2), dtype=float)
+
+
+class Tile:
+    """
+    One worker's share of the world. Boid k is owned by the tile whose
+    column and row contain it, with boids outside the world counted in the
+    nearest edge tile, so every boid has exactly one owner.
+    """
+    def __init__(self, col, row, cols, rows, tileWidth, tileHeight):
+        self.col, self.row = col, row
+        self.cols, self.rows = cols, rows
+        self.tileSize = np.array([tileWidth, tileHeight])
+        # edge tiles reach out to infinity
+        self.low = np.array([col*tileWidth if col > 0 else -np.inf, row*tileHeight if row > 0 else -np.inf])
+        self.high = np.array([(col + 1)*tileWidth if col < cols - 1 else np.inf,
+                              (row + 1)*tileHeight if row < rows - 1 else np.inf])
+        self.blocks = {}
+        self.arrays = {}
+        self.terrain = None
+        self.herds = []    # per flocking herd: (start, end, params, cls, owned rows, i, j, dist, mag2)
+
+    def attach(self, layout):
+        old = self.blocks
+        self.arrays, self.blocks, self.terrain = {}, {}, None
+        for name, (blockName, shape, dtype) in layout.items():
+            self.blocks[name], self.arrays[name] = attach(blockName, shape, dtype)
+        for block in old.values():
+            block.close()
+        if "gradientField" in self.arrays:
+            self.terrain = types.SimpleNamespace(gradientField=self.arrays["gradientField"],
+                                                 typegrid=self.arrays["typegrid"])
+
+    def owned(self, positions):
+        cells = np.floor(positions/self.tileSize).astype(np.int64)
+        col = np.clip(cells[:, 0], 0, self.cols - 1)
+        row = np.clip(cells[:, 1], 0, self.rows - 1)
+        return (col == self.col) & (row == self.row)
+
+    def search(self, n, radius, flocking):
+        """
+        Finds and keeps the visible pairs of the owned boids. Returns them as
+        sorted keys i*n + j, i and j world indices.
+        """
+        positions = self.arrays["position"][:n]
+        velocities = self.arrays["velocity"][:n]
+        owned = self.owned(positions)
+        # the halo: everything within radius of the tile, plus a pixel for rounding at the edges
+        margin = radius + 1
+        candidates = np.flatnonzero(np.all((positions >= self.low - margin) & (positions <= self.high + margin), axis=1))
+        i, j = neighbourPairs(positions[candidates], radius)
+        i, j = candidates[i], candidates[j]
+        keep = owned[i]
+        i, j = i[keep], j[keep]
+
+        self.herds = []
+        keys = [np.zeros(0, dtype=np.int64)]
+        for start, end, params, cls in flocking:
+            inHerd = (i >= start) & (i < end)
+            vi, vj, dist, mag2 = visibleNeighbours(params, positions, velocities, i[inHerd], j[inHerd])
+            rows = np.flatnonzero(owned[start:end]) + start
+            self.herds.append((start, end, params, cls, rows, vi, vj, dist, mag2))
+            keys.append(vi.astype(np.int64)*n + vj)
+        keys = np.concatenate(keys)
+        keys.sort()
+        return keys
+
+    def steer(self, dt, useAggregates, jit):
+        """Runs steerFlocking over the owned boids of every flocking herd found by the last search."""
+        for start, end, params, cls, rows, i, j, dist, mag2 in self.herds:
+            if not len(rows):
+                continue
+            flockKeys = self.arrays["flockKey"][start:end]
+            inFlock = flockmatePairs(flockKeys, i - start, j, start, end)
+            local = np.searchsorted(rows, i)
+            hasFlockNeighbours = np.bincount(local[inFlock], minlength=len(rows)) > 0
+            state = TileRows(self.arrays, rows)
+            if useAggregates:
+                avgVelocity, centerOffset = self.arrays["avgVelocity"][rows], self.arrays["centerOffset"][rows]
+            else:
+                avgVelocity = centerOffset = None
+            steerFlocking(state, params, cls, self.terrain, local, dist, mag2, self.arrays["velocity"][j],
+                          inFlock, hasFlockNeighbours, avgVelocity, centerOffset, dt, jit=jit)
+            self.arrays["newPosition"][rows] = state.position
+            self.arrays["newVelocity"][rows] = state.velocity
+            self.arrays["netForce"][rows] = state.netForce
+            self.arrays["acceleration"][rows] = state.acceleration
+
+    def close(self):
+        self.arrays, self.terrain = {}, None
+        for block in self.blocks.values():
+            block.close()
+        self.blocks = {}
+
+
+def tileWorker(pipe, bounds):
+    """Worker process: serves one tile's commands until told to close. Every command gets an (ok, reply)."""
+    tile = Tile(*bounds)
+    handlers = {"attach": tile.attach, "search": tile.search, "steer": tile.steer}
+    while True:
+        try:
+            command, *args = pipe.recv()
+        except EOFError:
+            break
+        if command == "close":
+            break
+        try:
+            pipe.send((True, handlers[command](*args)))
+        except Exception:
+            pipe.send((False, traceback.format_exc()))
+    tile.close()
@@ -0,0 +1,336 @@
+"""
+Recording runs to disk and replaying them.
+
+A recording is a header followed by chunks, all little-endian:
+
+    b"HERDREC\\x01", u32 header length, JSON header
+    chunk: b"CHNK", u64 first tick, u32 ticks, u32 payload length, payload
+    payload: u32 boid count per species (header order),
+             then per column (header order): u32 compressed length, zlib data
+
+The header holds the terrain reference (as Terrain.load takes it), the
+behaviours, the world's RNG seed, dt, the species order and the columns' dtypes.
+A chunk holds consecutive ticks with the same boid count per species.
+Each column is stored as one (ticks, boids, ...) array, with the boids
+ordered herd by herd. The columns are position, velocity and flock (the
+boid's flock label within its herd, see world.flockLabels).
+
+Recordings are only ever appended to: Recorder(append=True) adds chunks
+to an existing file, numbering the appended run's ticks on from the
+file's last tick. A reader memory-maps the file and walks the chunk
+headers to index it, so reading any tick decompresses only its chunk. A
+chunk cut short by a crash is ignored. If the run was rewound, the run
+carries on in a chunk starting at the restored tick's successor: that
+chunk overrides every older chunk's ticks from its first one on, so the
+abandoned future is never replayed.
+
+Only one world setup is kept per file: appending a run whose seed,
+terrain or behaviours differ from the header's is refused.
+"""
+import json
+import mmap
+import os
+import struct
+import time
+import types
+import zlib
+
+import numpy as np
+
+import boid
+from world import flockLabels
+
+magic = b"HERDREC\x01"
+chunkHeader = struct.Struct("<4sQII")
+columns = {"position": ("<f4", (2,)), "velocity": ("<f4", (2,)), "flock": ("<i4", ())}
+
+
+def behavioursToJson(behaviours):
+    """The behaviours with their slider types (int, float) written as names."""
+    return {species: {name: [v.__name__ if isinstance(v, type) else v for v in value] if isinstance(value, list) else value
+                      for name, value in params.items()}
+            for species, params in behaviours.items()}
+
+
+def behavioursFromJson(data):
+    sliderTypes = {"int": int, "float": float}
+    return {species: {name: [sliderTypes.get(v, v) if isinstance(v, str) else v for v in value] if isinstance(value, list) else value
+                      for name, value in params.items()}
+            for species, params in data.items()}
+
+
+def terrainReference(terrain):
+    """What Terrain(width, height, invert).load(...) needs to rebuild the terrain, in scenario key names."""
+    return {"heightmap": terrain.heightmapPath, "width": terrain.width, "height": terrain.height,
+            "terrain-type": terrain.terrainType, "levels": terrain.contour_levels, "invert": terrain.invert}
+
+
+class Recorder:
+    """
+    Streams a world's boid state to a recording, one row per tick, written
+    a chunk of chunkTicks ticks at a time. Call record() after every tick
+    and close() at the end.
+
+    Ticks are stored as passed to record(), except when appending: then the
+    first tick recorded becomes the one after the file's last tick, and the
+    rest keep their distance from it, so the appended run never hides the
+    recorded one.
+    """
+    def __init__(self, path, world, dt, chunkTicks=60, append=False):
+        self.path = path
+        self.chunkTicks = chunkTicks
+        self.species = list(world.herds.keys())
+        self.pending = []     # {column: array} per tick not yet written, ending at lastTick
+        self.counts = None
+        self.lastTick = None
+        self.tickOffset = None    # added to the ticks passed to record(), fixed by the first one
+        self.nextTick = None      # when appending, the tick the first record() is stored as
+        if append and os.path.exists(path):
+            existing = Replay(path)
+            header = existing.header
+            lastTick = existing.lastTick()
+            existing.close()
+            self.nextTick = lastTick + 1 if lastTick is not None else None
+            # the header describes the whole file, so the appended run must match it
+            current = json.loads(json.dumps(self.header(world, dt)))
+            for key in ("species", "seed", "terrain", "behaviours", "dt"):
+                if header[key] != current[key]:
+                    raise ValueError(f"can't append to {path}: its {key} differs from this run's")
+            self.file = open(path, "ab")
+        else:
+            data = json.dumps(self.header(world, dt)).encode()
+            self.file = open(path, "wb")
+            self.file.write(magic + struct.pack("<I", len(data)) + data)
+
+    def header(self, world, dt):
+        return {
+            "version": 1,
+            "terrain": terrainReference(world.terrain),
+            "behaviours": behavioursToJson(boid.behaviours),
+            "seed": world.seed,
+            "dt": dt,
+            "species": self.species,
+            "columns": {name: [dtype, list(shape)] for name, (dtype, shape) in columns.items()},
+        }
+
+    def record(self, world, tick):
+        """Adds the world's state as of tick."""
+        if self.tickOffset is None:
+            self.tickOffset = self.nextTick - tick if self.nextTick is not None else 0
+        tick += self.tickOffset
+        herds = list(world.herds.values())
+        counts = tuple(len(herd) for herd in herds)
+        if self.pending and (counts != self.counts or tick != self.lastTick + 1 or len(self.pending) >= self.chunkTicks):
+            self.flush()
+        self.counts = counts
+        self.lastTick = tick
+        self.pending.append({
+            "position": np.concatenate([herd.position for herd in herds]),
+            "velocity": np.concatenate([herd.velocity for herd in herds]),
+            "flock": np.concatenate([flockLabels(herd)[1] for herd in herds]),
+        })
+
+    def flush(self):
+        """Writes the pending ticks as one chunk."""
+        if not self.pending:
+            return
+        parts = [struct.pack(f"<{len(self.counts)}I", *self.counts)]
+        for name, (dtype, _) in columns.items():
+            data = zlib.compress(np.stack([row[name] for row in self.pending]).astype(dtype).tobytes(), 1)
+            parts += [struct.pack("<I", len(data)), data]
+        payload = b"".join(parts)
+        firstTick = self.lastTick - len(self.pending) + 1
+        self.file.write(chunkHeader.pack(b"CHNK", firstTick, len(self.pending), len(payload)) + payload)
+        self.file.flush()
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class Replay:
+    """Random access to the ticks of a recording."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(magic)] != magic:
+            raise ValueError(f"{path} is not a HerdSim recording")
+        (length,) = struct.unpack_from("<I", self.map, len(magic))
+        start = len(magic) + 4
+        self.header = json.loads(self.map[start:start + length])
+        self.species = self.header["species"]
+        self.index(start + length)
+        self.cached = None    # (chunk number, decoded columns) of the last chunk read
+
+    def index(self, offset):
+        """
+        Walks the chunk headers from offset, recording where each chunk and
+        its ticks are. Each chunk cuts the ticks of the chunks before it
+        short of its first tick (see the module docstring), so lasts can end
+        up before firsts for a chunk that was rewound past entirely.
+        """
+        firsts, counts, offsets = [], [], []
+        while offset + chunkHeader.size <= len(self.map):
+            tag, first, ticks, length = chunkHeader.unpack_from(self.map, offset)
+            if tag != b"CHNK" or offset + chunkHeader.size + length > len(self.map):
+                break  # cut short while being written
+            firsts.append(first)
+            counts.append(ticks)
+            offsets.append(offset + chunkHeader.size)
+            offset += chunkHeader.size + length
+        self.firsts = np.array(firsts, dtype=np.int64)
+        self.ticks = np.array(counts, dtype=np.int64)   # rows stored in each chunk
+        self.lasts = self.firsts + self.ticks - 1        # last tick each chunk still stands for
+        if len(firsts) > 1:
+            # the earliest first tick of any later chunk ends this one
+            laterFirst = np.minimum.accumulate(self.firsts[::-1])[::-1]
+            np.minimum(self.lasts[:-1], laterFirst[1:] - 1, out=self.lasts[:-1])
+        self.live = self.lasts >= self.firsts
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def firstTick(self):
+        return int(self.firsts[self.live].min()) if self.live.any() else None
+
+    def lastTick(self):
+        return int(self.lasts[self.live].max()) if self.live.any() else None
+
+    def chunkOf(self, tick):
+        """The chunk holding tick, or None."""
+        holding = np.flatnonzero((self.firsts <= tick) & (tick <= self.lasts))
+        return int(holding[-1]) if len(holding) else None
+
+    def chunk(self, k):
+        """Boid counts per species and the decoded columns of chunk k."""
+        if self.cached is not None and self.cached[0] == k:
+            return self.cached[1]
+        offset = self.offsets[k]
+        ticks = int(self.ticks[k])
+        counts = struct.unpack_from(f"<{len(self.species)}I", self.map, offset)
+        offset += 4*len(self.species)
+        data = {}
+        for name, (dtype, shape) in self.header["columns"].items():
+            (length,) = struct.unpack_from("<I", self.map, offset)
+            offset += 4
+            raw = zlib.decompress(self.map[offset:offset + length])
+            data[name] = np.frombuffer(raw, dtype=dtype).reshape(ticks, sum(counts), *shape)
+            offset += length
+        self.cached = (k, (counts, data))
+        return counts, data
+
+    def frame(self, tick):
+        """
+        {species: {column: array}} for one tick, or None if it wasn't recorded.
+        The arrays are read-only views into the decoded chunk.
+        """
+        k = self.chunkOf(tick)
+        if k is None:
+            return None
+        counts, data = self.chunk(k)
+        row = tick - int(self.firsts[k])
+        bounds = np.cumsum([0, *counts])
+        return {species: {name: column[row, start:end] for name, column in data.items()}
+                for species, start, end in zip(self.species, bounds[:-1], bounds[1:])}
+
+    def loadBehaviours(self):
+        """Replaces the current behaviours with the recorded ones."""
+        for species, params in behavioursFromJson(self.header["behaviours"]).items():
+            boid.behaviours[species] = params
+        boid.behavioursChanged()
+
+    def close(self):
+        self.cached = None
+        self.map.close()
+
+
+class ReplayState:
+    """A replayed tick in the shape of a sim_thread.RenderState, for SimCanvas."""
+    def __init__(self, herds, tick, alpha):
+        self.herds = herds
+        self.tick = tick
+        self.alpha = alpha
+
+    def alphaAt(self, now):
+        return self.alpha
+
+
+class ReplayPlayer:
+    """
+    Plays a recording back in place of a SimThread: SimCanvas sends it the
+    same commands and draws the states from latest(). The tick shown
+    follows the wall clock at the playback speed, negative speeds playing
+    backwards. No physics runs, so any speed costs the same.
+    """
+    def __init__(self, replay):
+        self.replay = replay
+        self.dt = replay.header["dt"]
+        self.paused = False
+        self.speed = 1
+        self.position = float(replay.firstTick() or 0)   # fractional tick being shown
+        self.lastTime = None
+
+    def start(self):
+        self.lastTime = time.perf_counter()
+
+    def pause(self, paused):
+        self.advance()
+        self.paused = paused
+
+    def setSpeed(self, speed):
+        self.advance()
+        self.speed = speed
+
+    def setGoal(self, species, goal):
+        pass  # a replay can't be steered
+
+    def setBehaviours(self, edited):
+        boid.setBehaviours(edited)  # only the sprites and overlays read them; nothing is simulated
+
+    def spawn(self, species, positions):
+        pass
+
+    def spawnAround(self, species, pos, n, spacing=5):
+        pass
+
+    def check(self):
+        pass
+
+    def stop(self, timeout=None):
+        self.replay.close()
+
+    def advance(self):
+        now = time.perf_counter()
+        if not self.paused and self.lastTime is not None:
+            self.position += (now - self.lastTime)*self.speed/self.dt
+            self.position = min(max(self.position, self.replay.firstTick()), self.replay.lastTick())
+        self.lastTime = now
+
+    def herdFrame(self, current, previous):
+        position = current["position"].astype(float)
+        prevPosition = previous["position"].astype(float) if previous is not None else position
+        return types.SimpleNamespace(prevPosition=prevPosition, position=position,
+                                     velocity=current["velocity"].astype(float),
+                                     hasVisableNeighbours=np.zeros(len(position), dtype=bool))
+
+    def latest(self):
+        if self.replay.lastTick() is None:
+            return None
+        self.advance()
+        tick = int(self.position)
+        current = self.replay.frame(tick)
+        if current is None:
+            return None
+        # interpolate from this tick towards the next one, as the live render does between ticks
+        following = self.replay.frame(tick + 1)
+        alpha = self.position - tick
+        if following is None:
+            following, alpha = current, 1.0
+        herds = {}
+        for species, columns in following.items():
+            previous = current[species] if len(current[species]["position"]) == len(columns["position"]) else None
+            herds[species] = self.herdFrame(columns, previous)
+        return ReplayState(herds, tick, alpha)
@@ -0,0 +1,104 @@
+"""
+Headless HerdSim runner.
+
+Runs a scenario for a fixed number of steps as fast as possible, with no
+display, and reports the step rate. Run from the repository root:
+
+    python -m run --spawn Sheep=2000 --steps 500
+    python -m run --scenario batch.json --steps 10000
+"""
+import argparse
+import json
+import os
+import sys
+
+import logs
+from headless import Simulation, default_scenario
+
+
+def parseSpawn(value):
+    species, _, n = value.partition("=")
+    if not n.isdigit():
+        raise argparse.ArgumentTypeError(f"expected SPECIES=N, got {value!r}")
+    return species, int(n)
+
+
+def buildParser():
+    parser = argparse.ArgumentParser(prog="python -m run", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", help="JSON file with scenario settings (see headless.default_scenario)")
+    parser.add_argument("--heightmap", help="greyscale heightmap image, flat terrain if omitted")
+    parser.add_argument("--terrain-size", choices=["small", "large"])
+    parser.add_argument("--terrain-type")
+    parser.add_argument("--border-mode", choices=["Bounce", "Wrap"])
+    parser.add_argument("--spawn", type=parseSpawn, action="append", metavar="SPECIES=N",
+                        help="boids to spawn per species, may be repeated")
+    parser.add_argument("--dt", type=float, help="fixed timestep in seconds")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--scalar", action="store_true", help="use the boid-by-boid update instead of the vectorized engine")
+    parser.add_argument("--flock-aggregates", action="store_true",
+                        help="steer by whole-flock centroid and heading instead of visible flockmates")
+    parser.add_argument("--verlet-skin", type=float, help="cache neighbour candidates with this much slack (px)")
+    parser.add_argument("--jit", action="store_true", help="use the Numba-compiled flocking kernels, if installed")
+    parser.add_argument("--workers", type=int, help="processes sharing the vectorized step, one per tile")
+    parser.add_argument("--record", metavar="PATH", help="stream every tick to a recording (see recording.py)")
+    parser.add_argument("--steps", type=int, default=1000, help="number of steps to run")
+    parser.add_argument("--log", metavar="SPEC", default=os.environ.get("HERDSIM_LOG", "warning"),
+                        help='log levels, e.g. "info,boid=debug" (default: $HERDSIM_LOG, else "warning")')
+    parser.add_argument("--verbose", action="store_true", help="log at debug level, down to every boid created")
+    return parser
+
+
+def scenarioFromArgs(args):
+    scenario = {}
+    if args.scenario:
+        with open(args.scenario) as f:
+            scenario.update(json.load(f))
+    overrides = {
+        "heightmap": args.heightmap,
+        "terrain-size": args.terrain_size,
+        "terrain-type": args.terrain_type,
+        "border-mode": args.border_mode,
+        "dt": args.dt,
+        "seed": args.seed,
+        "verlet-skin": args.verlet_skin,
+        "workers": args.workers,
+    }
+    scenario.update({key: value for key, value in overrides.items() if value is not None})
+    if args.spawn:
+        scenario["spawn"] = dict(args.spawn)
+    if args.scalar:
+        scenario["vectorized"] = False
+    if args.flock_aggregates:
+        scenario["flock-aggregates"] = True
+    if args.jit:
+        scenario["jit"] = True
+    unknown = set(scenario) - set(default_scenario)
+    if unknown:
+        raise SystemExit(f"Unknown scenario keys: {', '.join(sorted(unknown))}")
+    return scenario
+
+
+def main(argv=None):
+    args = buildParser().parse_args(argv)
+    scenario = scenarioFromArgs(args)
+
+    logs.configure("debug" if args.verbose else args.log)
+    sim = Simulation.fromScenario(scenario)
+    if args.record:
+        sim.record(args.record)
+
+    elapsed = sim.run(args.steps)
+    sim.close()
+    stepsPerSec = args.steps/elapsed if elapsed > 0 else float("inf")
+    engine = "vectorized" if sim.world.vectorized else "scalar"
+    print(f"{sim.boidCount()} boids, {args.steps} steps ({engine}) in {elapsed:.3f}s: "
+          f"{stepsPerSec:.1f} steps/s, {1e3*elapsed/max(args.steps, 1):.2f} ms/step")
+    phases = ", ".join(f"{name} {1e3*seconds:.2f}" for name, seconds in sim.world.timer.averages().items())
+    print(f"ms/step by phase: {phases}")
+    logs.dumpCounters()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+Runs a World on a background thread, so a slow physics frame never blocks Tk.
+
+The thread owns the world and the behaviours it is stepped with. It
+steps it on a fixed timestep and applies the UI's commands (pause,
+speed, goals, behaviour edits and spawns) between ticks. After each
+batch of ticks it publishes an immutable RenderState into a
+RenderBuffer. The canvas only reads the latest published state and never
+touches the world's arrays while they are being stepped.
+
+With a Recorder, every tick is also streamed to disk (see recording.py).
+
+With a History, the thread records the world as it steps. A negative
+speed plays the run backwards by restoring recorded states. Stepping
+forward again continues from the restored state and forgets the
+recorded states after it.
+"""
+import copy
+import queue
+import threading
+import time
+
+import numpy as np
+
+import boid
+from clock import FixedTimestep
+
+
+class HerdFrame:
+    """One herd's state in a RenderState. Read-only copies, laid out like the Herd fields of the same names."""
+    __slots__ = ("prevPosition", "position", "velocity", "hasVisableNeighbours")
+
+    def __init__(self, herd):
+        for name in self.__slots__:
+            array = getattr(herd, name).copy()
+            array.flags.writeable = False
+            setattr(self, name, array)
+
+    def __len__(self):
+        return len(self.position)
+
+
+class RenderState:
+    """
+    The world as it stood after the last batch of ticks: a HerdFrame per
+    species, and what the render interpolation needs to carry on between
+    publishes (see alphaAt).
+    """
+    def __init__(self, world, tick, alpha, dt, speed, paused):
+        self.herds = {species: HerdFrame(herd) for species, herd in world.herds.items()}
+        self.tick = tick
+        self.alpha = alpha          # fraction of a tick banked but not yet simulated when published
+        self.dt = dt
+        self.speed = speed
+        self.paused = paused
+        self.published = time.perf_counter()
+
+    def alphaAt(self, now):
+        """Render interpolation fraction at perf_counter time now, extrapolating the clock since publishing."""
+        if self.paused:
+            return self.alpha
+        return min(self.alpha + (now - self.published)*abs(self.speed)/self.dt, 1.0)
+
+
+class RenderBuffer:
+    """
+    Double buffer between the simulation thread and the canvas. The thread
+    builds the next state in the back slot while the canvas draws the front
+    one, and publish swaps them. States are never changed once built, so a
+    reader can keep using the one it got for as long as it likes.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.front = None
+        self.back = None
+
+    def publish(self, state):
+        with self.lock:
+            self.back = state
+            self.front, self.back = self.back, self.front
+
+    def latest(self):
+        with self.lock:
+            return self.front
+
+
+class SimThread(threading.Thread):
+    """
+    Steps a world with a FixedTimestep on its own thread. Other threads
+    must not touch the world while it runs. They send commands through
+    the methods below, which queue them for the thread to apply between
+    ticks, and read the world through buffer.latest().
+    """
+    def __init__(self, world, dt=1/60, maxSubsteps=8, history=None, recorder=None):
+        super().__init__(name="simulation", daemon=True)
+        self.world = world
+        self.clock = FixedTimestep(dt, maxSubsteps)
+        self.buffer = RenderBuffer()
+        self.commands = queue.Queue()
+        self.paused = False
+        self.speed = 1
+        self.tick = 0
+        self.history = history
+        self.rewoundTo = None    # tick of the recorded state restored by the last rewind
+        self.recorder = recorder
+        self.lastTime = None
+        self.running = True
+        self.error = None    # exception that stopped the thread, re-raised by check()
+
+    #### COMMANDS ##########################################
+
+    def pause(self, paused):
+        self.commands.put((self.applyPause, paused))
+
+    def setSpeed(self, speed):
+        """Playback speed as a multiple of real time. Negative speeds rewind through the history."""
+        self.commands.put((self.applySpeed, speed))
+
+    def setGoal(self, species, goal):
+        """Sets (or clears, with None) a species' goal, see World.setGoal."""
+        self.commands.put((self.world.setGoal, species, None if goal is None else np.array(goal, dtype=float)))
+
+    def setBehaviours(self, edited):
+        """Replaces the behaviours with a copy of edited between ticks, see boid.setBehaviours."""
+        self.commands.put((boid.setBehaviours, copy.deepcopy(edited)))
+
+    def spawn(self, species, positions):
+        """Spawns a boid of the species at each position."""
+        self.commands.put((self.applySpawn, species, [tuple(pos) for pos in positions]))
+
+    def spawnAround(self, species, pos, n, spacing=5):
+        """
+        Spawns n boids of the species scattered around pos, the i-th boid
+        i*spacing px off it diagonally. Which diagonal is drawn from the
+        world's generator, on the simulation thread.
+        """
+        self.commands.put((self.applySpawnAround, species, tuple(pos), n, spacing))
+
+    def call(self, function, *args):
+        """Runs function(*args) on the simulation thread between ticks."""
+        self.commands.put((function, *args))
+
+    def latest(self):
+        """The most recently published RenderState."""
+        return self.buffer.latest()
+
+    def stop(self, timeout=None):
+        self.commands.put((self.applyStop,))
+        self.join(timeout)
+
+    def check(self):
+        """Re-raises, on the caller's thread, the exception that stopped the simulation thread."""
+        if self.error is not None:
+            raise RuntimeError("simulation thread stopped") from self.error
+
+    #### SIMULATION THREAD ##################################
+
+    def applyPause(self, paused):
+        if self.paused and not paused:
+            self.lastTime = time.perf_counter()  # don't bank the time spent paused
+        self.paused = paused
+
+    def applySpeed(self, speed):
+        self.speed = speed
+
+    def applySpawn(self, species, positions):
+        self.world.spawnBatch(species, positions)
+
+    def applySpawnAround(self, species, pos, n, spacing):
+        signs = self.world.rng.choice([-1, 1], size=(n, 2))
+        offsets = spacing*np.arange(n)[:, None]*signs
+        self.applySpawn(species, np.asarray(pos, dtype=float) + offsets)
+
+    def stepWorld(self):
+        if self.rewoundTo is not None:
+            # carry on from the rewound state; the recorded future no longer happens
+            self.tick = self.rewoundTo
+            self.history.truncate(self.tick)
+            self.rewoundTo = None
+        self.world.step(self.clock.dt)
+        self.tick += 1
+        if self.history is not None:
+            with self.world.timer.phase("history"):
+                self.history.record(self.world, self.tick)
+        if self.recorder is not None:
+            with self.world.timer.phase("recording"):
+                self.recorder.record(self.world, self.tick)
+
+    def rewind(self, ticks):
+        """Goes back ticks in time, stopping at the oldest recorded state."""
+        if not ticks or self.history is None or not len(self.history):
+            return
+        self.tick = max(self.tick - ticks, self.history.oldestTick())
+        self.rewoundTo = self.history.restore(self.world, self.tick)
+
+    def applyStop(self):
+        self.running = False
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def handleCommands(self, timeout):
+        """Applies queued commands, waiting up to timeout seconds (forever for None) for the first."""
+        try:
+            command = self.commands.get(timeout=timeout)
+        except queue.Empty:
+            return
+        while True:
+            function, *args = command
+            function(*args)
+            try:
+                command = self.commands.get_nowait()
+            except queue.Empty:
+                return
+
+    def publish(self):
+        self.buffer.publish(RenderState(self.world, self.tick, self.clock.alpha(), self.clock.dt, self.speed, self.paused))
+
+    def run(self):
+        try:
+            self.lastTime = time.perf_counter()
+            self.publish()
+            timeout = 0
+            while self.running:
+                self.handleCommands(timeout)
+                now = time.perf_counter()
+                if not self.paused:
+                    ticks = self.clock.advance(now - self.lastTime, abs(self.speed))
+                    if self.speed < 0:
+                        self.rewind(ticks)
+                    else:
+                        for _ in range(ticks):
+                            self.stepWorld()
+                self.lastTime = now
+                self.publish()
+                # sleep until the next tick is due, unless a command arrives first
+                timeout = None if self.paused else max((self.clock.dt - self.clock.accumulator)/abs(self.speed), 0.001)
+        except Exception as error:
+            self.error = error
+            raise
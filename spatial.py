@@ -0,0 +1,159 @@
+import math
+
+import numpy as np
+
+
+class SpatialGrid:
+    """
+    Uniform grid that buckets boids by position so neighbour queries only
+    visit the cells around a boid instead of the whole world.
+    """
+    def __init__(self, cellSize=40):
+        assert cellSize > 0, "Cell size must be positive."
+        self.cellSize = cellSize
+        self.cells = {}       # (cx, cy) -> indices of the boids in that cell
+        self.boids = []
+        self.indices = {}     # id(boid) -> index in self.boids
+        self.boidCells = []   # cell currently holding each boid
+
+    def cellOf(self, position):
+        return (math.floor(position[0] / self.cellSize), math.floor(position[1] / self.cellSize))
+
+    def rebuild(self, boids, cellSize=None):
+        """Bucket every boid from scratch. Boids keep the order they are given in."""
+        if cellSize:
+            self.cellSize = cellSize
+        self.boids = list(boids)
+        self.cells = {}
+        self.indices = {}
+        self.boidCells = []
+        for i, boid in enumerate(self.boids):
+            cell = self.cellOf(boid.position)
+            self.cells.setdefault(cell, []).append(i)
+            self.indices[id(boid)] = i
+            self.boidCells.append(cell)
+
+    def update(self, boid):
+        """Move a boid to the cell matching its current position."""
+        i = self.indices[id(boid)]
+        cell = self.cellOf(boid.position)
+        oldCell = self.boidCells[i]
+        if cell == oldCell:
+            return
+        bucket = self.cells[oldCell]
+        bucket.remove(i)
+        if not bucket:
+            del self.cells[oldCell]
+        self.cells.setdefault(cell, []).append(i)
+        self.boidCells[i] = cell
+
+    def candidates(self, position, radius):
+        """
+        Returns the boids in every cell overlapping the square of half-width
+        radius around position, in the order they were given to rebuild.
+        Every boid within radius of position is guaranteed to be included.
+        """
+        cx0, cy0 = self.cellOf((position[0] - radius, position[1] - radius))
+        cx1, cy1 = self.cellOf((position[0] + radius, position[1] + radius))
+        found = []
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket:
+                    found.extend(bucket)
+        found.sort()
+        return [self.boids[i] for i in found]
+
+
+def neighbourPairs(positions, radius, cellSize=None):
+    """
+    Vectorized neighbour search over an Nx2 array of positions.
+
+    Returns index arrays (i, j) of every ordered pair i != j with
+    |positions[j] - positions[i]| <= radius, sorted by i and then j.
+    """
+    n = len(positions)
+    if n < 2 or radius <= 0:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    cellSize = cellSize or radius
+    span = math.ceil(radius / cellSize)
+
+    cells = np.floor(positions / cellSize).astype(np.int64)
+    cells -= cells.min(axis=0)
+    # pad by span so neighbouring cell keys never alias across rows
+    width = cells[:, 1].max() + 2*span + 1
+    keys = (cells[:, 0] + span)*width + (cells[:, 1] + span)
+    order = np.argsort(keys, kind="stable")
+    sortedKeys = keys[order]
+
+    iParts, jParts = [], []
+    for dx in range(-span, span + 1):
+        for dy in range(-span, span + 1):
+            target = keys + dx*width + dy
+            start = np.searchsorted(sortedKeys, target, side="left")
+            counts = np.searchsorted(sortedKeys, target, side="right") - start
+            total = counts.sum()
+            if total == 0:
+                continue
+            firsts = np.cumsum(counts) - counts
+            offsets = np.arange(total) - np.repeat(firsts, counts)
+            iParts.append(np.repeat(np.arange(n), counts))
+            jParts.append(order[np.repeat(start, counts) + offsets])
+
+    i = np.concatenate(iParts)
+    j = np.concatenate(jParts)
+    r = positions[j] - positions[i]
+    keep = (i != j) & (r[:, 0]*r[:, 0] + r[:, 1]*r[:, 1] <= radius**2)
+    i, j = i[keep], j[keep]
+    order = np.lexsort((j, i))
+    return i[order], j[order]
+
+
+class VerletList:
+    """
+    Neighbour pairs cached within radius + skin and reused across ticks.
+
+    A pair closer than radius now was closer than radius + skin when the
+    list was built, as long as no boid has moved more than skin/2 since,
+    so the cached pairs only need filtering by the current distance. The
+    list is rebuilt when some boid has moved further, when the boids or
+    the radius change, or when margin (the most any boid can still move
+    before the pairs are used) would take it past skin/2.
+    """
+    def __init__(self, skin):
+        assert skin > 0, "Skin must be positive."
+        self.skin = skin
+        self.radius = None
+        self.origin = None    # positions when the list was built
+        self.i = self.j = None
+        self.rebuilds = 0
+        self.updates = 0
+
+    def needsRebuild(self, positions, radius, margin=0):
+        if self.origin is None or len(positions) != len(self.origin) or radius != self.radius:
+            return True
+        moved = positions - self.origin
+        maxMoved = math.sqrt((moved[:, 0]*moved[:, 0] + moved[:, 1]*moved[:, 1]).max(initial=0))
+        return maxMoved + margin > self.skin/2
+
+    def update(self, positions, radius, margin=0):
+        """Rebuilds the cached pairs if needed. Returns whether it did."""
+        self.updates += 1
+        if not self.needsRebuild(positions, radius, margin):
+            return False
+        self.i, self.j = neighbourPairs(positions, radius + self.skin)
+        self.origin = positions.copy()
+        self.radius = radius
+        self.rebuilds += 1
+        return True
+
+    def pairs(self, positions):
+        """The cached pairs within radius at the current positions, sorted like neighbourPairs."""
+        r = positions[self.j] - positions[self.i]
+        keep = r[:, 0]*r[:, 0] + r[:, 1]*r[:, 1] <= self.radius**2
+        return self.i[keep], self.j[keep]
+
+    def candidates(self):
+        """For each boid, the indices of every boid in its cached list, in increasing order."""
+        bounds = np.searchsorted(self.i, np.arange(len(self.origin) + 1))
+        return np.split(self.j, bounds[1:-1])
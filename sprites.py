@@ -0,0 +1,37 @@
+"""
+Shared sprite images.
+
+Every boid of a species is drawn with the same icon at the same size, so
+sprites are cached by (path, size). Each image file is opened and resized
+once, and one PhotoImage is shared by every boid and canvas item using it.
+PhotoImages belong to the Tk interpreter that was running when they were
+made, so photo() must only be called once the app's Tk root exists.
+"""
+import functools
+
+from PIL import Image
+
+import logs
+
+logger = logs.getLogger("sprites")
+
+
+@functools.lru_cache(maxsize=None)
+def image(path, size):
+    """The image at path resized to size x size px, as a PIL image. Treat it as read-only."""
+    logger.debug("Loading sprite %s at %d px", path, size)
+    with Image.open(path) as original:
+        return original.resize((size, size))
+
+
+@functools.lru_cache(maxsize=None)
+def photo(path, size):
+    """image(path, size) as a Tk PhotoImage."""
+    from PIL import ImageTk  # imported here so headless runs never need tkinter
+    return ImageTk.PhotoImage(image(path, size))
+
+
+def clear():
+    """Forgets every cached sprite, e.g. after the Tk root they were made for is destroyed."""
+    photo.cache_clear()
+    image.cache_clear()
@@ -1,36 +1,68 @@
-import tkinter as tk
 import numpy as np
 import os
-from PIL import Image, ImageTk, ImageDraw
+from PIL import Image
+import logs
+from terrain_cache import TerrainCache
 
+logger = logs.getLogger("terrain")
 
-color_map = {
-    "Grass": {
+
+# Terrain class registry: class id -> name, contour colours and movement properties.
+# "speed" scales how far a boid moves per step, "drag" scales the slope drag it feels.
+# Every class is neutral (1.0) for now, so boids move the same on any terrain as they always have.
+terrain_classes = {
+    0: {
+        "name": "Grass",
         "bg_color": "#B9D8B2",
         "shade_color": "#000000",
+        "speed": 1.0,
+        "drag": 1.0,
     },
-    "Sand": {
+    1: {
+        "name": "Sand",
         "bg_color": "#FBDB93",
         "shade_color": "#7B4019",
+        "speed": 1.0,
+        "drag": 1.0,
     },
-    "Ice": {
+    2: {
+        "name": "Ice",
         "bg_color": "#84E3F0",
         "shade_color": "#103436",
+        "speed": 1.0,
+        "drag": 1.0,
     },
-    "Shallows": {
+    3: {
+        "name": "Shallows",
         "bg_color": "#1461A0",
         "shade_color": "#09263D",
+        "speed": 1.0,
+        "drag": 1.0,
     },
 }
+terrain_class_ids = {terrainClass["name"]: classId for classId, terrainClass in terrain_classes.items()}
+
+# name -> colours, kept for lookups by terrain type name
+color_map = {terrainClass["name"]: terrainClass for terrainClass in terrain_classes.values()}
+
+def classPropertyTable(prop):
+    """Array indexed by class id holding one movement property, for per-pixel lookups."""
+    return np.array([terrain_classes[classId][prop] for classId in range(len(terrain_classes))], dtype=float)
+
+canvasMultiplier = {"small": 1.5, "large": 2}  # terrain side = 256*multiplier
+
+terrain_speed = classPropertyTable("speed")
+terrain_drag = classPropertyTable("drag")
 
 class Terrain:
-    def __init__(self, w, h, invert=True):
+    def __init__(self, w, h, invert=True, cache=True):
         """
         Initializes the Terrain object with a heightmap from a greyscale image.
         
         :param greyscaleImagePath: Path to the greyscale image file.
         :param w: Width of the terrain.
         :param h: Height of the terrain.
+        :param cache: True for the default TerrainCache, a TerrainCache, or False to always preprocess.
         """
         
         assert w > 0 and h > 0, "Width and height must be positive integers."
@@ -45,8 +77,9 @@ class Terrain:
         
         self.contourImg = None
         self.terrainType = "Grass"  # Default terrain type
+        self.heightmapPath = None  # greyscale image the heightmap was loaded from, None for flat terrain
         
-        self.typegrid = np.zeros(self.heightmap.shape, dtype="S")  # RGB grid for terrain coloring
+        self.typegrid = np.zeros(self.heightmap.shape, dtype=np.uint8)  # terrain class id of every pixel, see terrain_classes
         
         self.contourImgs = {
             "Grass": None,
@@ -59,43 +92,80 @@ class Terrain:
         
         self.contour_levels = 15  
         
+        self.cache = TerrainCache() if cache is True else (cache or None)
+        self.cacheKey = None
+        
     def load(self, greyscaleImagePath=None, terrainType="Grass", levels=15):
         """
         Loads the heightmap from a greyscale image file.
         
         :param greyscaleImagePath: Path to the greyscale image file.
         """
-        print(f"Loading terrain from {greyscaleImagePath} with size ({self.width}, {self.height}) and terrain type '{terrainType}'")
-        if greyscaleImagePath:
-            self.heightmap, self.heightmapImg = self.getHeightmap(greyscaleImagePath, self.width, self.height)
-        
-        if self.invert:
-            # Invert the heightmap for better visualization
-            self.heightmap = 255 - self.heightmap
-        
-        self.gradientField = self.generateGradientField()
-        
-        #generate contour map images for each terrain type
+        logger.info("Loading terrain from %s with size (%d, %d) and terrain type '%s'",
+                    greyscaleImagePath, self.width, self.height, terrainType)
         assert terrainType in color_map, f"Unknown terrain type: {terrainType}"
         
+        self.heightmapPath = greyscaleImagePath
+        self.cacheKey = None
+        if self.cache and greyscaleImagePath and os.path.exists(greyscaleImagePath):
+            self.cacheKey = self.cache.key(greyscaleImagePath, self.width, self.height, self.invert, levels)
+        
+        heightmap = self.cache.load(self.cacheKey, "heightmap") if self.cacheKey else None
+        gradientField = self.cache.load(self.cacheKey, "gradientField") if self.cacheKey else None
+        
+        if heightmap is not None and gradientField is not None:
+            # warm start: the cached arrays are already resized, inverted and differentiated
+            logger.info("Using cached terrain %.12s", self.cacheKey)
+            self.heightmap = heightmap
+            self.heightmapImg = Image.fromarray((255 - heightmap if self.invert else heightmap).astype(np.uint8))
+            self.gradientField = gradientField
+        else:
+            if greyscaleImagePath:
+                self.heightmap, self.heightmapImg = self.getHeightmap(greyscaleImagePath, self.width, self.height)
+            
+            if self.invert:
+                # Invert the heightmap for better visualization
+                self.heightmap = 255 - self.heightmap
+            
+            self.gradientField = self.generateGradientField()
+            
+            if self.cacheKey:
+                self.cache.store(self.cacheKey, "heightmap", self.heightmap)
+                self.cache.store(self.cacheKey, "gradientField", self.gradientField)
+        
+        #contour map images for the other terrain types are generated when first painted
         self.terrainType = terrainType
-        
-        for terrain, colors in color_map.items():
-            bg_color = colors["bg_color"]
-            shade_color = colors["shade_color"]
-            contour_img = self.generate_contour_map(bg_color, levels=levels, shade_color=shade_color)
-            self.contourImgs[terrain] = contour_img
-        self.contourImg = self.contourImgs[terrainType]
+        self.contour_levels = levels
+        self.contourImgs = {terrain: None for terrain in color_map}
+        self.contourImg = self.getContourImg(terrainType).copy()  # painted in place, keep the source clean
         
         # update the typegrid with the terrain type
-        self.typegrid.fill(terrainType.encode('utf-8'))
+        self.typegrid.fill(terrain_class_ids[terrainType])
         
-        print(f"Terrain loaded with heightmap shape: {self.heightmap.shape}")
-        print(f"Terrain loaded with gradient field shape: {self.gradientField.shape}")
-        print(f"Contour map generated for terrain type: {terrainType} with {levels} levels.")
+        logger.debug("Terrain loaded with heightmap shape: %s", self.heightmap.shape)
+        logger.debug("Terrain loaded with gradient field shape: %s", self.gradientField.shape)
+        logger.debug("Contour map generated for terrain type: %s with %d levels.", terrainType, levels)
         
         
     
+    def loadContourMap(self, terrainType, levels):
+        """
+        Returns the contour image for a terrain type, from the cache when the
+        heightmap, levels and colours match a cached raster.
+        """
+        colors = color_map[terrainType]
+        name = f"contour-{terrainType}-{colors['bg_color'].lstrip('#')}-{colors['shade_color'].lstrip('#')}"
+        
+        cached = self.cache.load(self.cacheKey, name) if self.cacheKey else None
+        if cached is not None:
+            self.contour_levels = levels
+            return Image.fromarray(cached)
+        
+        contour_img = self.generate_contour_map(colors["bg_color"], levels=levels, shade_color=colors["shade_color"])
+        if self.cacheKey:
+            self.cache.store(self.cacheKey, name, np.asarray(contour_img))
+        return contour_img
+    
     def getHeightmap(self, greyscaleImagePath, w, h):
         """
         Returns a 2D numpy array of the heightmap
@@ -140,45 +210,60 @@ class Terrain:
         # Compute contour levels
         thresholds = np.linspace(0, 255, levels+1)
 
-        # Prepare output image
-        color_data = np.zeros((*gray_data.shape, 3), dtype=np.uint8)
-
+        # Colour lookup table: entry i+1 is level i, entries 0 and levels+1 (outside [0, 255)) stay black
+        lut = np.zeros((levels+2, 3), dtype=np.uint8)
         for i in range(levels):
-            lower = thresholds[i]
-            upper = thresholds[i+1]
-            mask = (gray_data >= lower) & (gray_data < upper)
             t = i / max(levels-1, 1)
-            fill_color = self.interpolate_color(bg_rgb, shade_rgb, t * 0.7)  # 0.7 to avoid going full black
-            color_data[mask] = fill_color
+            lut[i+1] = self.interpolate_color(bg_rgb, shade_rgb, t * 0.7)  # 0.7 to avoid going full black
+
+        # Quantize every pixel to its level and look up its colour in one pass
+        color_data = lut[np.searchsorted(thresholds, gray_data, side="right")]
 
-        print(f"Contour map generated with {levels} levels.")
+        logger.debug("Contour map generated with %d levels.", levels)
         return Image.fromarray(color_data)
         
+    def getContourImg(self, terrainType):
+        """
+        Returns the contour image for a terrain type, generating it the first
+        time that type is needed.
+        """
+        if self.contourImgs.get(terrainType) is None:
+            self.contourImgs[terrainType] = self.loadContourMap(terrainType, self.contour_levels)
+        return self.contourImgs[terrainType]
 
-    def color_region(self, mask, terrain_type="desert"):
+    def color_region(self, mask, terrain_type="desert", offset=(0, 0)):
         """
         Colors a region of the heightmap based on a mask.
         
+        Only the window covered by the mask is read and written, so painting
+        with a small brush costs the same on any terrain size.
+        
         :param mask: 2D numpy array of boolean values indicating the region to color.
         :param terrain_type: Type of terrain to color (e.g., "desert", "ice", "shallows").
+        :param offset: (x, y) of the mask's top-left pixel on the terrain.
+        :return: Box (x0, y0, x1, y1) of the window that was updated.
         """
-        assert mask.shape == self.heightmap.shape, "Mask shape must match heightmap shape."
-        
-        contourImage = np.array(self.contourImg)
+        x0, y0 = offset
+        x1, y1 = x0 + mask.shape[1], y0 + mask.shape[0]
+        assert 0 <= x0 and 0 <= y0 and x1 <= self.width and y1 <= self.height, "Mask must lie inside the heightmap."
+        box = (x0, y0, x1, y1)
         
         #replace the current contour image pixels with the saved contour image corresponding to the terrain type according to the mask
-        # in one go with vectorized operations
-        
-        otherContourImage = np.array(self.contourImgs[terrain_type])
-        mask_indices = np.where(mask)
-        # Color the pixels in the contour image based on the mask
-        contourImage[mask_indices] = otherContourImage[mask_indices]
+        # in one go with vectorized operations, on the mask's window only
+        contourWindow = np.array(self.contourImg.crop(box))
+        otherContourWindow = np.array(self.getContourImg(terrain_type).crop(box))
+        contourWindow[mask] = otherContourWindow[mask]
 
         # Update the contour image with the new colored region
-        self.contourImg = Image.fromarray(contourImage)
+        self.contourImg.paste(Image.fromarray(contourWindow), box[:2])
         
         #update the typegrid with the terrain type
-        self.typegrid[mask_indices] = terrain_type.encode('utf-8')
+        self.typegrid[y0:y1, x0:x1][mask] = terrain_class_ids[terrain_type]
+        return box
+    
+    def classAt(self, x, y):
+        """Terrain class id under a point."""
+        return self.typegrid[int(y), int(x)]
     
     def compute_gradient(self, x, y):
         h, w = self.heightmap.shape
@@ -199,14 +284,32 @@ class Terrain:
         """
         Generates a gradient field for the heightmap.
         
+        Whole-array version of compute_gradient: central differences in the
+        interior and one-sided differences on the clamped edges.
+        
         :return: 2D numpy array of gradients (dx, dy).
         """
         h, w = self.heightmap.shape
         gradient_field = np.zeros((h, w, 2), dtype=float)
-
-        for y in range(h):
-            for x in range(w):
-                gradient_field[y, x] = -1*self.compute_gradient(x, y)
+        
+        x = np.arange(w)
+        x_left = np.maximum(0, x-1)
+        x_right = np.minimum(w-1, x+1)
+        y = np.arange(h)
+        y_bottom = np.maximum(0, y-1)
+        y_top = np.minimum(h-1, y+1)
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gradient_field[..., 0] = -(self.heightmap[:, x_right] - self.heightmap[:, x_left]) / (x_right - x_left)
+            gradient_field[..., 1] = -(self.heightmap[y_top, :] - self.heightmap[y_bottom, :]) / (y_top - y_bottom)[:, None]
 
         return gradient_field
-    
\ No newline at end of file
+
+
+def generateTerrain(terrainSize, terrainType, heightMapPath=None, levels=15, invert=True):
+    """
+    Generates a terrain based on the given parameters.
+    """
+    terrain = Terrain(int(256*canvasMultiplier[terrainSize]), int(256*canvasMultiplier[terrainSize]), invert=invert)
+    terrain.load(heightMapPath, terrainType, levels=levels)
+    return terrain
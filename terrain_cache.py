@@ -0,0 +1,50 @@
+import hashlib
+import os
+
+import numpy as np
+
+CACHE_DIR = os.environ.get("HERDSIM_TERRAIN_CACHE", ".terrain_cache")
+FORMAT_VERSION = 1  # bump when the cached arrays change meaning
+
+
+class TerrainCache:
+    """
+    Content-addressed on-disk cache of preprocessed terrains.
+
+    Each entry is a directory named after a hash of the heightmap file
+    contents and the preprocessing settings, holding one .npy file per array.
+    Entries are loaded as read-only memory maps, so a warm start reads only
+    the pages that are actually used.
+    """
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+
+    def key(self, heightmapPath, w, h, invert, levels):
+        digest = hashlib.sha256()
+        with open(heightmapPath, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        digest.update(f"|{w}x{h}|invert={invert}|levels={levels}|v{FORMAT_VERSION}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def path(self, key, name):
+        return os.path.join(self.directory, key, f"{name}.npy")
+
+    def load(self, key, name):
+        """Memory-maps one cached array, or returns None if it is not cached."""
+        path = self.path(key, name)
+        if not os.path.exists(path):
+            return None
+        try:
+            return np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None  # truncated or corrupt entry, rebuild it
+
+    def store(self, key, name, array):
+        """Writes one array into the entry. Readers never see a partially written file."""
+        path = self.path(key, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmpPath = f"{path}.{os.getpid()}.tmp"
+        with open(tmpPath, "wb") as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(tmpPath, path)
@@ -0,0 +1,59 @@
+"""
+2D vector math on plain floats.
+
+The per-boid update works on one 2-vector at a time, where NumPy's per-call
+overhead is far larger than the arithmetic itself. These functions take any
+length-2 sequence (tuple, list or a Herd row converted with .tolist()) and
+return Python floats and (x, y) tuples, so they never allocate an array.
+"""
+import math
+
+
+def vec(v):
+    """An (x, y) tuple of Python floats from any length-2 sequence or array."""
+    x, y = v.tolist() if hasattr(v, "tolist") else v
+    return (float(x), float(y))
+
+def add(a, b):
+    return (a[0] + b[0], a[1] + b[1])
+
+def sub(a, b):
+    return (a[0] - b[0], a[1] - b[1])
+
+def scale(v, s):
+    return (v[0]*s, v[1]*s)
+
+def dot(a, b):
+    return a[0]*b[0] + a[1]*b[1]
+
+def ssq(v):
+    """Squared magnitude of v."""
+    return v[0]*v[0] + v[1]*v[1]
+
+def magnitude(v):
+    return math.hypot(v[0], v[1])
+
+def unit(v):
+    """Unit vector in the direction of v. The zero vector stays zero."""
+    mag = math.hypot(v[0], v[1])
+    if mag == 0:
+        return (0.0, 0.0)
+    return (v[0]/mag, v[1]/mag)
+
+def inViewCone(heading, r, cosViewAngle):
+    """
+    Whether r lies within the view angle either side of heading, given the
+    cosine of that angle. Compares the dot product with the cosine scaled by
+    the magnitudes, squared so no sqrt or acos is needed. A zero heading or
+    offset counts as perpendicular: inside iff the view angle is 90 degrees
+    or more.
+    """
+    d = heading[0]*r[0] + heading[1]*r[1]
+    limit = cosViewAngle*cosViewAngle*ssq(heading)*ssq(r)
+    if cosViewAngle > 0:
+        return d > 0 and d*d >= limit
+    return d >= 0 or d*d <= limit
+
+def clampUnit(v):
+    """v rescaled to unit length if it is longer than 1."""
+    return unit(v) if ssq(v) > 1 else v
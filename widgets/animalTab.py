@@ -2,6 +2,9 @@ from tkinter import ttk
 import tkinter as tk
 from PIL import Image, ImageTk
 from tktooltip import ToolTip
+import logs
+
+logger = logs.getLogger("ui")
 
 class SpeciesTab(tk.Frame):
     def __init__(self, parent, f_unselect_terrains):
@@ -68,7 +71,7 @@ class SpeciesTab(tk.Frame):
         self.spawnSizeSlider.pack(pady=5)
     
     def handleSliderChange(self, value):
-        print(f"Spawn size changed to: {value}")
+        logger.debug("Spawn size changed to: %s", value)
         self.spawnSizeSlider.set(value)
         
             
@@ -76,7 +79,7 @@ class SpeciesTab(tk.Frame):
         self.selected_animal = animal
             
     def clickAnimal(self,selected):
-        print(f"Clicked {selected}")
+        logger.debug("Clicked %s", selected)
                 
         for btn in self.animal_btns:
             if btn.tag == selected:
@@ -95,10 +98,10 @@ class SpeciesTab(tk.Frame):
                         
             
         
-        print(f"Selected animal: {self.selected_animal}")
+        logger.debug("Selected animal: %s", self.selected_animal)
     
     def unselect_all(self):
-        print("Unselecting all animal btns")
+        logger.debug("Unselecting all animal btns")
         self.selectAnimal(None)
         for btn in self.animal_btns:
             btn.configure(relief="raised", bg="#E2F0D9")
\ No newline at end of file
@@ -9,6 +9,11 @@ class BehaviourTab(tk.Frame):
         super().__init__(parent, bg="#F5FBEF")
         self.pack(fill="both", expand=True)
 
+        # sliders edit this copy; each finished edit (clamped by updateParamBoundaries) is published
+        # as a whole, and the simulation thread swaps it in between ticks (see SimThread.setBehaviours)
+        self.edited = copy.deepcopy(behaviours)
+        self.publish = boid.setBehaviours  # the simulation replaces it with its thread's once it exists
+
         self.species = list(default_behaviours.keys())
         self.selection = self.species[0]
         self.selector_idx = 0
@@ -65,10 +70,10 @@ class BehaviourTab(tk.Frame):
 
         param_row = 0
         for param in default_behaviours[self.selection]:
-            if isinstance(behaviours[self.selection][param], int): 
+            if isinstance(self.edited[self.selection][param], int): 
                 continue
             
-            min_val, max_val, step, val_type, val = behaviours[self.selection][param]
+            min_val, max_val, step, val_type, val = self.edited[self.selection][param]
 
             param_frame = tk.Frame(visible_frame, bg="#F5FBEF")
             param_frame.grid(row=param_row, column=0, sticky="ew", pady=2)
@@ -141,8 +146,8 @@ class BehaviourTab(tk.Frame):
                 value_var.set(str(new_val))
             
             # Ensure value is within bounds
-            min_val = behaviours[self.selection][param][0]
-            max_val = behaviours[self.selection][param][1]
+            min_val = self.edited[self.selection][param][0]
+            max_val = self.edited[self.selection][param][1]
             
             if new_val < min_val:
                 new_val = min_val
@@ -158,18 +163,19 @@ class BehaviourTab(tk.Frame):
                     value_var.set(str(int(new_val)))
                 
             # Update the behaviour value
-            behaviours[self.selection][param][4] = new_val
+            self.edited[self.selection][param][4] = new_val
             
             # Update the slider to match
             self.sliders[param].set(new_val)
             
             boid.lastModified= {"species": self.selection, "parameter": param, "time": time.time()}
-            updateParamBoundaries()
+            updateParamBoundaries(self.edited)
             self.refresh_sliders()
+            self.publish(self.edited)
             
         except ValueError:
             # Restore the previous valid value if conversion fails
-            old_val = behaviours[self.selection][param][4]
+            old_val = self.edited[self.selection][param][4]
             if val_type == float:
                 value_var.set(f"{old_val:.1f}")
             else:
@@ -185,18 +191,19 @@ class BehaviourTab(tk.Frame):
         else:
             self.value_entries[param].set(str(int(typed_val)))
         
-        # Update the value in behaviours
-        behaviours[self.selection][param][4] = typed_val
+        # Update the value in the edited behaviours
+        self.edited[self.selection][param][4] = typed_val
         
         # Update dependent parameters
         boid.lastModified = {"species": self.selection, "parameter": param, "time": time.time()}
-        updateParamBoundaries()
+        updateParamBoundaries(self.edited)
         self.refresh_sliders()
+        self.publish(self.edited)
 
     def refresh_sliders(self):
         # Update slider bounds and values to reflect current parameter constraints
         for key, slider in self.sliders.items():
-            param_config = behaviours[self.selection][key]
+            param_config = self.edited[self.selection][key]
             min_val = param_config[0]
             max_val = param_config[1]
             current_val = param_config[4]
@@ -238,7 +245,8 @@ class BehaviourTab(tk.Frame):
         self.create_sliders()
 
     def reset_to_default(self):
-        behaviours[self.selection] = copy.deepcopy(default_behaviours[self.selection])
+        self.edited[self.selection] = copy.deepcopy(default_behaviours[self.selection])
+        self.publish(self.edited)
         self.create_sliders()
     
     
@@ -1,5 +1,8 @@
 import tkinter as tk
 from tkinter import ttk
+import logs
+
+logger = logs.getLogger("ui")
 
 
 class MediaController(tk.Frame):
@@ -10,6 +13,7 @@ class MediaController(tk.Frame):
         self.isPaused = False
         
         self.dtMultiplier = 1
+        self.onChange = None  # called after pausing or changing speed, e.g. to tell the simulation thread
         
         # Load your icons
         self.pauseIcon = tk.PhotoImage(file="icons/pause.png")
@@ -25,8 +29,8 @@ class MediaController(tk.Frame):
         font = ("comic-sans", 9, "bold")
 
         # Add 3 buttons in center columns with nature colors
-        self.btn1 = tk.Button(self, text="Rewind (x4)", bg="#8CBF3D", fg="#FEFAE0", font=font, bd=0)
-        self.btn2 = tk.Button(self, text="Rewind (x2)", bg="#8CBF3D", fg="#FEFAE0", font=font, bd=0)
+        self.btn1 = tk.Button(self, text="Rewind (x4)", bg="#8CBF3D", fg="#FEFAE0", font=font, bd=0, command=self.rewind4x)
+        self.btn2 = tk.Button(self, text="Rewind (x2)", bg="#8CBF3D", fg="#FEFAE0", font=font, bd=0, command=self.rewind2x)
         self.btn3 = tk.Button(self, image=self.pauseIcon, bg="#A5D16C", fg="#FEFAE0", font=font, bd=0, activebackground="black", command= self.pausePlay)
         self.btn4 = tk.Button(self, text="Forward (x2)", bg="#8CBF3D", fg="#FEFAE0", font=font, bd=0, command=self.fastForward2x )
         self.btn5 = tk.Button(self, text="Forward (x4)", bg="#8CBF3D", fg="#FEFAE0", font=font, bd=0, command=self.fastForward4x)
@@ -49,10 +53,48 @@ class MediaController(tk.Frame):
             self.btn3.config(image=self.playIcon)
         else:
             self.btn3.config(image=self.pauseIcon)
+        self.changed()
+
+    def changed(self):
+        if self.onChange:
+            self.onChange()
+
+    def rewind4x(self):
+        # negative multipliers play the recorded history backwards
+        if self.dtMultiplier != -4:
+            logger.info("Speed: Rewind x4")
+            self.dtMultiplier = -4
+            #set active style
+            self.btn1.config(bg="black")
+            #deactivate other button styles
+            self.btn2.config(bg="#8CBF3D")
+            self.btn4.config(bg="#8CBF3D")
+            self.btn5.config(bg="#8CBF3D")
+        else:
+            logger.info("Speed: Normal")
+            self.dtMultiplier = 1
+            self.btn1.config(bg="#8CBF3D")
+        self.changed()
+    
+    def rewind2x(self):
+        if self.dtMultiplier != -2:
+            logger.info("Speed: Rewind x2")
+            self.dtMultiplier = -2
+            #set active style
+            self.btn2.config(bg="black")
+            #deactivate other button styles
+            self.btn1.config(bg="#8CBF3D")
+            self.btn4.config(bg="#8CBF3D")
+            self.btn5.config(bg="#8CBF3D")
+        else:
+            logger.info("Speed: Normal")
+            self.dtMultiplier = 1
+            self.btn2.config(bg="#8CBF3D")
+        self.changed()
 
     def fastForward2x(self):
-        if self.dtMultiplier in [1,4]:
-            print("Speed: x2")
+        if self.dtMultiplier != 2:
+            logger.info("Speed: x2")
             self.dtMultiplier = 2
             #set active style
             self.btn4.config(bg="black")
@@ -61,13 +103,14 @@ class MediaController(tk.Frame):
             self.btn2.config(bg="#8CBF3D")
             self.btn5.config(bg="#8CBF3D") 
         else:
-            print("Speed: Normal")
+            logger.info("Speed: Normal")
             self.dtMultiplier = 1
             self.btn4.config(bg="#8CBF3D")
+        self.changed()
     
     def fastForward4x(self):
-        if self.dtMultiplier in [1,2]:
-            print("Speed: x4")
+        if self.dtMultiplier != 4:
+            logger.info("Speed: x4")
             self.dtMultiplier = 4
             #set active style
             self.btn5.config(bg="black")
@@ -76,6 +119,7 @@ class MediaController(tk.Frame):
             self.btn2.config(bg="#8CBF3D")
             self.btn4.config(bg="#8CBF3D") 
         else:
-            print("Speed: Normal")
+            logger.info("Speed: Normal")
             self.dtMultiplier = 1
-            self.btn5.config(bg="#8CBF3D")
\ No newline at end of file
+            self.btn5.config(bg="#8CBF3D")
+        self.changed()
@@ -1,21 +1,30 @@
-import itertools
 import tkinter as tk
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import numpy as np
 from boid import behaviours
 
 import boid
+import sprites
+import logs
 import time
 
 from vector import vectorAngle
+from world import World
+from clock import PhaseTimer
+from sim_thread import SimThread
+from history import History
+from recording import Recorder, ReplayPlayer
 
-import random
+logger = logs.getLogger("canvas")
 
 paintWindowWidth = 55
 paintWindowStep = 5
 
 borderMode = "Bounce"
 
+physicsDt = 1/60     # fixed simulation timestep (s)
+maxSubsteps = 8      # cap on physics ticks per batch on the simulation thread
+
 testMode = True
 
 
@@ -36,7 +45,7 @@ obstacles = {
 
 
 class SimCanvas(tk.Canvas):
-    def __init__(self, parent, terrain, controller, mediaController):
+    def __init__(self, parent, terrain, controller, mediaController, record=None, replay=None, seed=None):
         self.width = terrain.width - 4 # -4 for the border
         self.height = terrain.height - 4 # -4 for the border
         
@@ -48,10 +57,21 @@ class SimCanvas(tk.Canvas):
                          )
         
         self.grid(row=0, column=0, padx=20, pady=(20, 0), sticky="nsew")
-        self.spawned_boids = {species: [] for species in behaviours.keys()}
+        self.world = World(terrain, width=self.width, height=self.height, borderMode=borderMode, seed=seed)
+        # the world is stepped on its own thread, or a recording (a recording.Replay) is played back
+        # instead. Either way the canvas only draws the states they publish
+        if replay is not None:
+            self.simThread = ReplayPlayer(replay)
+        else:
+            recorder = Recorder(record, self.world, physicsDt) if record else None
+            self.simThread = SimThread(self.world, physicsDt, maxSubsteps, history=History(), recorder=recorder)
+        self.frameTimer = PhaseTimer()  # per-frame phases; self.world.timer holds the per-tick ones
+        self.renderState = None
+        self.canvasIds = {species: [] for species in behaviours.keys()}  # one canvas image per boid, in herd order
         self.obstacles = []
         self.controller = controller
         self.mediaController = mediaController
+        self.mediaController.onChange = self.mediaChanged
         self.windowRec = None
         
         self.bgPhoto = None
@@ -61,7 +81,7 @@ class SimCanvas(tk.Canvas):
         self.isPainting = False
         
         self.waypoints = {species: None for species in behaviours.keys()}
-        self.waypointImages = {"Sheep": ImageTk.PhotoImage(Image.open(f"icons/sheep_waypoint.png").resize((30, 30)))}
+        self.waypointImages = {"Sheep": sprites.photo("icons/sheep_waypoint.png", 30)}
         
         
         self.setBgImage(terrain.contourImg)
@@ -84,55 +104,90 @@ class SimCanvas(tk.Canvas):
         
         #right click to place waypoint
         self.bind("<Button-3>", self.handleRightClick)
+        
+        self.simThread.start()
+
+    def close(self):
+        """Stops the simulation thread and the world's worker processes."""
+        self.simThread.stop()
+        self.world.close()
+        sprites.clear()
+
+    def mediaChanged(self):
+        self.simThread.pause(self.mediaController.isPaused)
+        self.simThread.setSpeed(self.mediaController.dtMultiplier)
+
+    def sprite(self, species):
+        """The image every boid of a species is drawn with, shared through the sprite cache."""
+        return sprites.photo(f"icons/{species.lower()}_land.png", behaviours[species]["size"])
 
     def setBgImage(self, bgImage):
-        self.bgPhoto = ImageTk.PhotoImage(bgImage)
-        self.bgPhotoID = self.create_image(0, 0, anchor=tk.NW, image=self.bgPhoto)
-        self.lower(self.bgPhotoID)  # Ensure the background image is at the bottom layer        
+        if self.bgPhoto is None:
+            self.bgPhoto = ImageTk.PhotoImage(bgImage)
+            self.bgPhotoID = self.create_image(0, 0, anchor=tk.NW, image=self.bgPhoto)
+            self.lower(self.bgPhotoID)  # Ensure the background image is at the bottom layer        
+        else:
+            # reuse the same photo and canvas item so items don't pile up
+            self.bgPhoto.paste(bgImage)
+    
+    def updateBgRegion(self, box):
+        """Copies one window of the terrain's contour image into the background photo."""
+        patch = ImageTk.PhotoImage(self.terrain.contourImg.crop(box))
+        self.tk.call(str(self.bgPhoto), "copy", str(patch), "-to", box[0], box[1])
     
     #update canvas
     def update(self, fps,ti):
-        self.delete("visual_param")
-        
         tf = time.time()
-        dt = tf-ti
-        dt *= self.mediaController.dtMultiplier
+        self.simThread.check()
         
-        #draw animals
-        for species in self.spawned_boids.keys():
-            for animal in self.spawned_boids[species]:
-                self.visualizeParams()               
-                if not self.mediaController.isPaused:
-                    allBoids = list(itertools.chain.from_iterable(self.spawned_boids.values()))  # Flatten the list of boids
-                    animal.update(allBoids, self.terrain, dt)
-                    animal.setGoal(self.waypoints[species])
-                    animal.handleBorder(borderMode,w=self.width,h=self.height)
-                self.coords(animal.canvasId, animal.position[0], animal.position[1])
+        # physics runs on the simulation thread (see SimThread); take the latest state it published
+        self.renderState = self.simThread.latest()
         
+        #draw animals, interpolated between the last two ticks
+        with self.frameTimer.phase("render"):
+            if self.renderState is not None:
+                alpha = self.renderState.alphaAt(time.perf_counter())
+                for species, frame in self.renderState.herds.items():
+                    canvasIds = self.canvasIds[species]
+                    positions = self.world.renderPositions(frame, alpha).tolist()
+                    for position in positions[len(canvasIds):]:
+                        # boids spawned since the last frame
+                        canvasIds.append(self.create_image(position[0], position[1], image=self.sprite(species)))
+                    for canvasId in canvasIds[len(positions):]:
+                        # boids rewound to before they were spawned
+                        self.delete(canvasId)
+                    del canvasIds[len(positions):]
+                    for canvasId, position in zip(canvasIds, positions):
+                        self.coords(canvasId, position[0], position[1])
         
-        self.after(int(1000/fps), lambda: self.update(fps, tf))
+        with self.frameTimer.phase("overlays"):
+            self.delete("visual_param")
+            self.visualizeParams()
+        
+        # schedule the next frame for the remainder of the frame budget
+        elapsed = time.time() - tf
+        self.after(max(1, int(1000/fps - 1000*elapsed)), lambda: self.update(fps, tf))
 
     def visualizeParams(self):
         if not testMode: 
-            print("Activate test mode to visualise params")
+            logger.info("Activate test mode to visualise params")
         else:
             
             # print(boid.lastModified)
-            if not boid.lastModified: return
+            if not boid.lastModified or self.renderState is None: return
+            frame = self.renderState.herds[boid.lastModified["species"]]
+            animals = list(zip(frame.position[:5], frame.velocity[:5], frame.hasVisableNeighbours[:5]))
             
             #radial vizualizations
             if boid.lastModified["parameter"] in ["comfort-zone", "danger-zone"]:
-                for animal in self.spawned_boids[boid.lastModified["species"]][:5]:
-                    if animal.species != boid.lastModified["species"]: continue
+                for position, _, _ in animals:
                     radius = behaviours[boid.lastModified["species"]].get(boid.lastModified["parameter"],None)
                     if radius:
-                        self.create_oval(animal.position[0]-radius[4]//1, animal.position[1]-radius[4]//1 ,animal.position[0]+radius[4]//1, animal.position[1]+radius[4]//1, fill=None, outline="#C1E1C1", width=2, tags="visual_param")
+                        self.create_oval(position[0]-radius[4]//1, position[1]-radius[4]//1 ,position[0]+radius[4]//1, position[1]+radius[4]//1, fill=None, outline="#C1E1C1", width=2, tags="visual_param")
             
             #angle vizualizations
             if boid.lastModified["parameter"] in ["obstacle-range", "flockmate-range", "view-angle"]:
-                for animal in self.spawned_boids[boid.lastModified["species"]][:5]:
-                    if animal.species != boid.lastModified["species"]: continue
-                    
+                for position, velocity, hasVisableNeighbours in animals:
                     arcRadius = behaviours[boid.lastModified["species"]].get(boid.lastModified["parameter"],None)
                     
                     if boid.lastModified["parameter"] == "view-angle":
@@ -140,7 +195,7 @@ class SimCanvas(tk.Canvas):
                     
                     viewAngle = behaviours[boid.lastModified["species"]].get("view-angle", None)
                     if arcRadius and viewAngle:
-                        centerTheta = vectorAngle([animal.velocity[0], -animal.velocity[1]])
+                        centerTheta = vectorAngle([velocity[0], -velocity[1]])
                         startTheta = (centerTheta - viewAngle[4]) % 360
                         
                         
@@ -148,12 +203,12 @@ class SimCanvas(tk.Canvas):
                         if boid.lastModified["parameter"] == "obstacle-range":
                             arcColour = "#C1E1C1"
                         elif boid.lastModified["parameter"] == "flockmate-range":
-                            arcColour = "red" if animal.hasVisableNeighbours else "#C1E1C1"
+                            arcColour = "red" if hasVisableNeighbours else "#C1E1C1"
                         elif boid.lastModified["parameter"] == "view-angle":
                             arcColour = "#C1E1C1"
                             
-                        self.create_arc(animal.position[0]-arcRadius[4], animal.position[1]-arcRadius[4],
-                                        animal.position[0]+arcRadius[4], animal.position[1]+arcRadius[4],
+                        self.create_arc(position[0]-arcRadius[4], position[1]-arcRadius[4],
+                                        position[0]+arcRadius[4], position[1]+arcRadius[4],
                                         start=startTheta, extent= 2*viewAngle[4], fill=None, outline=arcColour, width=2, tags="visual_param")
                     
     # event handlers
@@ -161,63 +216,49 @@ class SimCanvas(tk.Canvas):
         if self.controller.get_selected_animal() is not None:
             pos = (e.x,e.y)
             selectedSpecies = self.controller.get_selected_animal()
-            print(f"Spawning {selectedSpecies} at: ({pos[0]}, {pos[1]})")
+            logger.debug("Spawning %s at: (%s, %s)", selectedSpecies, pos[0], pos[1])
             
-            for i in range(self.controller.get_spawn_size()):
-                # spawn boid
-                offsetPos = [random.choice([pos[0]-i*5, pos[0]+i*5]), random.choice([pos[1]-i*5, pos[1]+i*5])]
-                animal = boid.factory(species=selectedSpecies, pos= offsetPos)
-                animal.loadImage(f"icons/{selectedSpecies.lower()}_land.png")
-                image = animal.tkImage
-                if image:
-                    # draw image
-                    animal.canvasId = self.create_image(e.x, e.y, image=image)
-
-                    # add to boid list
-                    self.spawned_boids[selectedSpecies].append(animal)
-                else: 
-                    print("Failed to draw")
+            # spawned on the simulation thread, scattered with the world's generator;
+            # update() draws them once they show up in a published state
+            self.simThread.spawnAround(selectedSpecies, pos, self.controller.get_spawn_size())
         elif self.controller.get_selected_terrain() is not None:
             terrain = self.controller.get_selected_terrain()
-            print(f"Painting {terrain} at: ({e.x}, {e.y})")
+            logger.debug("Painting %s at: (%s, %s)", terrain, e.x, e.y)
             self.isPainting = True
-            print("isPainting:", self.isPainting)
+            logger.debug("isPainting: %s", self.isPainting)
             
             # #paint terrain
             #draw placeable terrain
             if terrain in ["Tree", "Stone"]:
                 size = obstacles[terrain]["size"]         
                 
-                image = Image.open(f"./icons/{terrain.lower()}.png").resize((size, size))
-                tkImage = ImageTk.PhotoImage(image)
+                tkImage = sprites.photo(f"./icons/{terrain.lower()}.png", size)
                 self.obstacles.append((terrain, e.x, e.y, tkImage))
-                if image:
-                    # draw image
-                    self.create_image(e.x, e.y, image=tkImage)
+                # draw image
+                self.create_image(e.x, e.y, image=tkImage)
                     
             if terrain in ["Sand"]:
                 #loop through all pixels in the paint window circle
                 self.fill_paint_window(e, terrain)
         
     def fill_paint_window(self, e, terrain_type):
-        shape = self.terrain.contourImg.size
+        w, h = self.terrain.contourImg.size
         radius = paintWindowWidth // 2
         radius_sq = radius * radius 
         
-        mask = np.zeros(shape, dtype=bool)
+        # brush bounding box, clipped to the terrain
         x_start = max(0, e.x - radius)
-        x_end = min(self.width + 4, e.x + radius)
+        x_end = min(w, e.x + radius)
         y_start = max(0, e.y - radius)
-        y_end = min(self.height + 4, e.y + radius)
+        y_end = min(h, e.y + radius)
+        if x_start >= x_end or y_start >= y_end:
+            return
         
-        for x in range(x_start, x_end):
-            for y in range(y_start, y_end):
-                if (x - e.x) ** 2 + (y - e.y) ** 2 <= radius_sq:
-                    mask[y, x] = True
-        # Convert mask to a list of coordinates
+        y, x = np.ogrid[y_start:y_end, x_start:x_end]
+        mask = (x - e.x) ** 2 + (y - e.y) ** 2 <= radius_sq
         
-        self.terrain.color_region(mask, terrain_type)
-        self.setBgImage(self.terrain.contourImg)  # Update the background image to reflect the changes
+        box = self.terrain.color_region(mask, terrain_type, offset=(x_start, y_start))
+        self.updateBgRegion(box)  # Update the background image to reflect the changes
         
                     
     def handleHover(self, e):
@@ -250,11 +291,10 @@ class SimCanvas(tk.Canvas):
         
         if self.controller.get_selected_terrain() != None:
             if e.num == 4 or e.delta > 0:
-                print(f"Increasing brush size: {paintWindowWidth}")
+                logger.debug("Increasing brush size: %s", paintWindowWidth)
                 paintWindowWidth = min(150, paintWindowWidth+ paintWindowStep)
             elif e.num == 5 or e.delta < 0:
-                print("Scrolled down")
-                print(f"decreasing brush size: {paintWindowWidth}")
+                logger.debug("Decreasing brush size: %s", paintWindowWidth)
                 paintWindowWidth = max(0, paintWindowWidth - paintWindowStep)
             
             #delete previous window    
@@ -272,26 +312,28 @@ class SimCanvas(tk.Canvas):
             
             if self.waypoints[selectedSpecies] is not None:
                 self.waypoints[selectedSpecies] = None
+                self.simThread.setGoal(selectedSpecies, None)
                 self.delete("waypoint")
                 return
             
             #set waypoint for selected animal
             pos = (e.x,e.y)
-            print(f"Placing waypoint for {selectedSpecies} at: ({pos[0]}, {pos[1]})")
+            logger.debug("Placing waypoint for %s at: (%s, %s)", selectedSpecies, pos[0], pos[1])
             self.waypoints[selectedSpecies] = np.array(pos, dtype=float)
+            self.simThread.setGoal(selectedSpecies, self.waypoints[selectedSpecies])
             self.create_image(pos[0], pos[1], image=self.waypointImages[selectedSpecies], tags="waypoint")
         
             
     def handleReleaseClick(self, e):
         #print(f"Mouse released at ({e.x}, {e.y})")
         self.isPainting = False
-        print("Mouse released")
-        print("isPainting:", self.isPainting)
+        logger.debug("Mouse released")
+        logger.debug("isPainting: %s", self.isPainting)
         
     def handleReleaseClickRight(self, e):
         #print(f"Mouse released at ({e.x}, {e.y})")
         self.isErasing = False
-        print("Mouse released")
-        print("isErasing:", self.isErasing)
+        logger.debug("Mouse released")
+        logger.debug("isErasing: %s", self.isErasing)
 
         
\ No newline at end of file
@@ -3,6 +3,7 @@ import tkinter as tk
 from widgets.controller import Controller
 from widgets.media_controller import MediaController
 from widgets.sim_canvas import SimCanvas
+import logs
 
 #### SIMULATION CLASS ####################
 windowSizeMap = {"small": "680x490", "large": "810x600"}
@@ -10,7 +11,7 @@ canvasMultiplier = {"small": 1.5, "large": 2}
 
 class Simulation(tk.Tk):
     ### a) Contructor
-    def __init__(self, terrainSize,terrain):
+    def __init__(self, terrainSize,terrain, record=None, replay=None, seed=None):
         super().__init__()
         self.title("HerdSim")
         self.geometry(f"{windowSizeMap[terrainSize]}")
@@ -23,15 +24,27 @@ class Simulation(tk.Tk):
         # Add widgets
         self.controller = Controller(self)
         self.media = MediaController(self)
-        self.canvas = SimCanvas(self, terrain, self.controller, self.media)
+        self.canvas = SimCanvas(self, terrain, self.controller, self.media, record=record, replay=replay, seed=seed)
+        # behaviour edits reach the world between ticks, through the simulation thread
+        self.controller.behaviourTab.publish = self.canvas.simThread.setBehaviours
         
         
+        # stop the simulation thread before the window goes
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        
+        # F2 logs how often each counted event (spawns, ...) has happened
+        self.bind_all("<F2>", lambda event: logs.dumpCounters())
+        
         #Focus widget on click
         self.bind_all("<Button-1>", lambda event: (
             event.widget.focus_set()
             ))
         
 
+    def close(self):
+        self.canvas.close()
+        self.destroy()
+
     ### b) Function to center window on screen        
     def center_window(self, terrainSize):
         screen_width = self.winfo_screenwidth()
@@ -1,6 +1,9 @@
 import tkinter as tk
 from PIL import Image, ImageTk
 from tktooltip import ToolTip
+import logs
+
+logger = logs.getLogger("ui")
 
 
 class TerrainTab(tk.Frame):
@@ -52,7 +55,7 @@ class TerrainTab(tk.Frame):
         self.selected_terrain = terrain
             
     def clickTerrain(self,selected):
-        print(f"Clicked {selected}")
+        logger.debug("Clicked %s", selected)
                 
         for btn in self.terrain_btns:
             if btn.tag == selected:
@@ -70,10 +73,10 @@ class TerrainTab(tk.Frame):
                         btnOther.configure(relief="raised", bg="#E2F0D9")                    
             
         
-        print(f"Selected terrain: {self.selected_terrain}")
+        logger.debug("Selected terrain: %s", self.selected_terrain)
         
     def unselect_all(self):
-        print("Unselecting all terrain btns")
+        logger.debug("Unselecting all terrain btns")
         self.selectTerrain(None)
         for btn in self.terrain_btns:
             btn.configure(relief="raised", bg="#E2F0D9")
\ No newline at end of file
@@ -0,0 +1,449 @@
+import itertools
+import math
+
+import numpy as np
+
+import herd as kernels
+import herd_jit
+import logs
+from clock import PhaseTimer
+from boid import behaviours, factory, neighbourhoodRadius, spawnBatch, speciesClass, speciesParams
+from herd import Herd
+from spatial import SpatialGrid, VerletList, neighbourPairs
+from terrain import terrain_drag, terrain_speed
+
+logger = logs.getLogger("world")
+
+
+class WorldSnapshot:
+    """State captured at the start of a tick, shared by every herd during the step phase."""
+    def __init__(self, herds):
+        self.herds = herds        # herds with at least one boid
+        self.boids = []           # scalar engine: every boid, in update order
+        self.candidates = None    # scalar engine with Verlet lists: each boid's cached candidates
+        self.offsets = None       # vectorized engine: first world index of each herd (+ total)
+        self.positions = None
+        self.velocities = None
+        self.i = self.j = None    # candidate neighbour pairs (world indices); visible pairs with workers
+
+
+class World:
+    """
+    Every herd in the simulation and the terrain they move over.
+
+    step() runs the flocking rules as vectorized kernels over each herd's
+    arrays. All herds read the same snapshot of positions and velocities
+    taken at the start of the step. With vectorized=False the world falls
+    back to updating each Boid in turn with its own methods.
+
+    With flockAggregates=True, cohesion and alignment steer towards the
+    centroid and heading of the boid's whole flock, read from the flock's
+    running sums, instead of averaging over its visible flockmates.
+
+    With verletSkin set, neighbour candidates are cached within
+    neighbourhoodRadius() + verletSkin and only searched for again once
+    some boid has moved more than half the skin.
+
+    With jit=True and Numba installed, the vectorized engine runs the
+    flocking rules, terrain drag and integration as one compiled kernel
+    (herd_jit.flockStep). Without Numba it keeps the NumPy kernels.
+
+    With workers > 1, the vectorized engine splits the neighbour search and
+    the steering rules over that many processes, one per tile of the world
+    (see parallel.py), with the same result as a single process. Workers
+    search every tick, so verletSkin is ignored. Call close() to stop them.
+
+    Every random draw (a spawned boid's start velocity, spawn scatter)
+    comes from self.rng, seeded with seed, so the same seed and the same
+    commands give the same run bit for bit. Without a seed, one is drawn
+    and kept in self.seed.
+    """
+    def __init__(self, terrain, width=None, height=None, borderMode="Bounce", vectorized=True, flockAggregates=False,
+                 verletSkin=None, jit=False, workers=1, seed=None):
+        self.terrain = terrain
+        self.width = width if width is not None else terrain.width
+        self.height = height if height is not None else terrain.height
+        self.borderMode = borderMode
+        self.vectorized = vectorized
+        self.flockAggregates = flockAggregates
+        if jit and not herd_jit.available:
+            logger.warning("Numba is not installed, using the NumPy kernels.")
+        self.jit = jit and herd_jit.available
+        # an unseeded world still picks a concrete seed, so its recording says how to replay it
+        self.seed = seed if seed is not None else np.random.SeedSequence().entropy
+        self.rng = np.random.default_rng(self.seed)  # every random draw of the run, so a seed replays it exactly
+
+        self.herds = {species: Herd(species) for species in behaviours.keys()}
+        for species, herd in self.herds.items():
+            herd.flockSums = flockAggregates and speciesClass(species).flocking
+        self.goals = {species: None for species in behaviours.keys()}
+        self.grid = SpatialGrid(neighbourhoodRadius())
+        self.verlet = VerletList(verletSkin) if verletSkin else None
+        self.candidates = None     # scalar engine: per-boid candidate lists of the current Verlet build
+        self.candidatesBuild = None
+        self.timer = PhaseTimer()
+        self.parallel = None
+        if vectorized and workers > 1:
+            from parallel import ParallelStepper  # starts the worker processes, so only imported when asked for
+            self.parallel = ParallelStepper(workers, self.width, self.height, timer=self.timer)
+
+    def close(self):
+        """Stops the worker processes, if any."""
+        if self.parallel:
+            self.parallel.close()
+            self.parallel = None
+
+    def spawn(self, species, pos):
+        """Creates a boid of the given species in its herd, drawing its start velocity from self.rng."""
+        animal = factory(species=species, pos=pos, herd=self.herds[species], rng=self.rng)
+        animal.goal = self.goals[species]
+        animal.useFlockAggregates = self.flockAggregates
+        return animal
+
+    def spawnBatch(self, species, positions):
+        """Creates a boid of the given species at each of positions in one go, see boid.spawnBatch."""
+        herd = self.herds[species]
+        start = len(herd)
+        animals = spawnBatch(species, positions, herd, rng=self.rng)
+        goal = self.goals[species]
+        herd.hasGoal[start:] = goal is not None
+        if goal is not None:
+            herd.goal[start:] = goal
+        for animal in animals:
+            animal.useFlockAggregates = self.flockAggregates
+        return animals
+
+    def boids(self):
+        """Every boid in the world, herd by herd."""
+        return list(itertools.chain.from_iterable(herd.boids for herd in self.herds.values()))
+
+    def setGoal(self, species, goal):
+        """Sets (or clears, with None) the goal every boid of a species heads for."""
+        self.goals[species] = goal
+        herd = self.herds[species]
+        herd.hasGoal[:] = goal is not None
+        if goal is not None:
+            herd.goal[:] = goal
+
+    def step(self, dt):
+        """
+        Advances the world by one tick in phases, each timed in self.timer:
+        snapshot the world, step every species and resolve borders, then with
+        flockAggregates add the tick's moves to the flock sums. Within the
+        step phase, the flocking rules and integration are also timed on
+        their own as "rules".
+        """
+        with self.timer.phase("snapshot"):
+            snapshot = self.snapshot(dt)
+            # the vectorized engines move boids in bulk, so their flock sums are shifted after the tick
+            moved = self.flockState() if self.flockAggregates and self.vectorized else None
+        with self.timer.phase("step"):
+            if self.vectorized:
+                self.stepVectorized(snapshot, dt)
+            else:
+                self.stepScalar(snapshot, dt)
+        with self.timer.phase("borders"):
+            if self.flockAggregates and not self.vectorized:
+                moved = self.flockState()  # scalar boids shift their own flock as they move; only borders are left
+            self.resolveBorders()
+        if moved is not None:
+            with self.timer.phase("flocks"):
+                self.shiftFlocks(moved)
+
+    def renderPositions(self, herd, alpha):
+        """
+        Positions of a herd interpolated alpha of the way from the previous
+        tick to the current one. Boids that wrapped around a border are drawn
+        at their current position instead of sweeping across the world.
+        """
+        delta = herd.position - herd.prevPosition
+        positions = herd.prevPosition + alpha*delta
+        jumped = (np.abs(delta[:, 0]) > self.width/2) | (np.abs(delta[:, 1]) > self.height/2)
+        positions[jumped] = herd.position[jumped]
+        return positions
+
+    def snapshot(self, dt=0):
+        """
+        Records every boid's position before the tick and, for the vectorized
+        engine, copies all herds into world-wide arrays with their candidate
+        neighbour pairs. The scalar engine instead buckets the boids in the grid,
+        or with Verlet lists hands each boid its cached candidates. dt is the
+        tick about to run, which bounds how far boids move during the sweep.
+        """
+        for herd in self.herds.values():
+            herd.prevPosition[:] = herd.position
+        snapshot = WorldSnapshot([herd for herd in self.herds.values() if len(herd)])
+
+        if self.vectorized:
+            if snapshot.herds:
+                snapshot.offsets = np.cumsum([0] + [len(herd) for herd in snapshot.herds])
+                if self.parallel:
+                    snapshot.positions, snapshot.velocities = self.parallel.publish(snapshot.herds, snapshot.offsets,
+                                                                                    self.terrain)
+                    flocking = [(start, end, speciesParams(herd.species), speciesClass(herd.species))
+                                for herd, start, end in zip(snapshot.herds, snapshot.offsets[:-1], snapshot.offsets[1:])
+                                if speciesClass(herd.species).flocking]
+                    snapshot.i, snapshot.j = self.parallel.search(snapshot.offsets[-1], neighbourhoodRadius(), flocking)
+                    return snapshot
+                snapshot.positions = np.concatenate([herd.position for herd in snapshot.herds])
+                snapshot.velocities = np.concatenate([herd.velocity for herd in snapshot.herds])
+                if self.verlet:
+                    self.verlet.update(snapshot.positions, neighbourhoodRadius())
+                    snapshot.i, snapshot.j = self.verlet.pairs(snapshot.positions)
+                else:
+                    snapshot.i, snapshot.j = neighbourPairs(snapshot.positions, neighbourhoodRadius())
+        else:
+            snapshot.boids = self.boids()
+            if self.verlet:
+                # boids query each other mid-sweep, so leave room for one more tick of movement
+                positions = np.concatenate([herd.position for herd in snapshot.herds]) if snapshot.herds else np.zeros((0, 2))
+                self.verlet.update(positions, neighbourhoodRadius(), margin=self.maxStep(dt))
+                if self.candidatesBuild != self.verlet.rebuilds:
+                    self.candidates = [[snapshot.boids[k] for k in row.tolist()] for row in self.verlet.candidates()]
+                    self.candidatesBuild = self.verlet.rebuilds
+                snapshot.candidates = self.candidates
+            else:
+                self.grid.rebuild(snapshot.boids, neighbourhoodRadius())
+        return snapshot
+
+    def maxStep(self, dt):
+        """Upper bound on how far any boid can move in one tick of dt."""
+        bound = 0.0
+        for herd in self.herds.values():
+            if not len(herd):
+                continue
+            if speciesClass(herd.species).flocking:
+                speed = speciesParams(herd.species).maxVelocity*terrain_speed.max()
+            else:
+                t = herd.time_alive.max() + dt
+                speed = 2*math.sqrt(1 + t*t)  # speed of the spiral at time t
+            bound = max(bound, speed*dt)
+        return bound
+
+    def stepScalar(self, snapshot, dt):
+        """Updates boids one at a time, each seeing the moves of the boids before it."""
+        if snapshot.candidates is not None:
+            for animal, candidates in zip(snapshot.boids, snapshot.candidates):
+                animal.update(candidates, self.terrain, dt)
+            return
+        for animal in snapshot.boids:
+            animal.update(snapshot.boids, self.terrain, dt, grid=self.grid)
+            self.grid.update(animal)
+
+    def stepVectorized(self, snapshot, dt):
+        """Steps every herd from the same snapshot of positions and velocities."""
+        if self.parallel:
+            self.stepParallel(snapshot, dt)
+            return
+        i, j = snapshot.i, snapshot.j
+        for herd, start, end in zip(snapshot.herds, snapshot.offsets[:-1], snapshot.offsets[1:]):
+            if speciesClass(herd.species).flocking:
+                inHerd = (i >= start) & (i < end)
+                self.stepFlocking(herd, snapshot.positions, snapshot.velocities, i[inHerd], j[inHerd], start, end, dt)
+            else:
+                kernels.spiral(herd, dt)
+
+    def stepParallel(self, snapshot, dt):
+        """
+        stepVectorized with the tile workers: the flock merges and leaves run
+        here over the visible pairs the workers found, timed as "merges", then
+        the workers steer.
+        """
+        i, j = snapshot.i, snapshot.j
+        flocking = []
+        for herd, start, end in zip(snapshot.herds, snapshot.offsets[:-1], snapshot.offsets[1:]):
+            if not speciesClass(herd.species).flocking:
+                kernels.spiral(herd, dt)
+                continue
+            with self.timer.phase("merges"):
+                inHerd = (i >= start) & (i < end)
+                hi, hj = i[inHerd] - start, j[inHerd]
+                flockKeys = self.mergeFlocks(herd, speciesParams(herd.species), hi, hj, start, end)
+                inFlock = flockmatePairs(flockKeys, hi, hj, start, end)
+                hasFlockNeighbours = np.bincount(hi[inFlock], minlength=len(herd)) > 0
+                self.leaveFlocks(herd, hasFlockNeighbours)
+                targets = self.flockTargets(herd, hasFlockNeighbours) if self.flockAggregates else ()
+                self.parallel.publishFlocks(start, end, flockKeys, *targets)
+            flocking.append((herd, start, end))
+
+        with self.timer.phase("rules"):
+            self.parallel.steer(dt, self.flockAggregates, self.jit)
+            for herd, start, end in flocking:
+                self.parallel.collect(herd, start, end)
+
+    def resolveBorders(self):
+        for herd in self.herds.values():
+            if len(herd):
+                kernels.handleBorder(herd, self.borderMode, self.width, self.height)
+
+    def flockState(self):
+        """Copies of each flocking herd's positions and velocities, for shiftFlocks."""
+        return {herd: (herd.position.copy(), herd.velocity.copy())
+                for herd in self.herds.values() if len(herd) and speciesClass(herd.species).flocking}
+
+    def shiftFlocks(self, moved):
+        """
+        Adds each boid's change since flockState() was taken to its flock's
+        running sums. Merges and leaves keep the sums exact themselves, so
+        only the moves are left, applied as one sum per flock.
+        """
+        for herd, (position, velocity) in moved.items():
+            roots, labels = flockLabels(herd)
+            dPosition = kernels.sumRows(herd.position - position, labels, len(roots)).tolist()
+            dVelocity = kernels.sumRows(herd.velocity - velocity, labels, len(roots)).tolist()
+            for root, dp, dv in zip(roots, dPosition, dVelocity):
+                root.shift(dPosition=dp, dVelocity=dv)
+
+    def stepFlocking(self, herd, positions, velocities, i, j, start, end, dt):
+        """
+        Vectorized Sheep.update for one herd. i and j are world indices of the
+        candidate neighbour pairs whose first boid belongs to this herd.
+        """
+        params = speciesParams(herd.species)
+        i, j, dist, mag2 = visibleNeighbours(params, positions, velocities, i, j)
+        i = i - start
+
+        # flock neighbours: visible members of the boid's (possibly merged) flock
+        flockKeys = self.mergeFlocks(herd, params, i, j, start, end)
+        inFlock = flockmatePairs(flockKeys, i, j, start, end)
+        hasFlockNeighbours = np.bincount(i[inFlock], minlength=len(herd)) > 0
+        self.leaveFlocks(herd, hasFlockNeighbours)
+
+        # steering rules, terrain drag and integration, timed apart from the flock bookkeeping above
+        with self.timer.phase("rules"):
+            avgVelocity, centerOffset = self.flockTargets(herd, hasFlockNeighbours) if self.flockAggregates else (None, None)
+            steerFlocking(herd, params, speciesClass(herd.species), self.terrain, i, dist, mag2, velocities[j],
+                          inFlock, hasFlockNeighbours, avgVelocity, centerOffset, dt, jit=self.jit)
+
+    def mergeFlocks(self, herd, params, i, j, start, end):
+        """
+        Flock merges from a herd's visible pairs (i local to the herd, j world
+        indices), in the same boid and neighbour order as the scalar update.
+        Returns a key per boid identifying its flock after the merges.
+        """
+        # Flocks only grow while merging, so pairs whose flocks are already too big
+        # to combine can be dropped up front.
+        sameHerd = (j >= start) & (j < end)
+        roots = [animal.flock for animal in herd.boids]
+        flockKeys = np.array([id(root) for root in roots])
+        flockSizes = np.array([root.size for root in roots])
+        maxHerdSize = params.herdSize
+        a, b = i[sameHerd], j[sameHerd] - start
+        mergeable = sameHerd.copy()
+        mergeable[sameHerd] = (flockKeys[a] != flockKeys[b]) & (flockSizes[a] + flockSizes[b] <= maxHerdSize)
+        merged = -1
+        for a, b in zip(i[mergeable].tolist(), (j[mergeable] - start).tolist()):
+            if a != merged and herd.boids[a].mergeFlock(herd.boids[b]):
+                merged = a
+        return np.array([id(animal.flock) for animal in herd.boids])
+
+    def leaveFlocks(self, herd, hasFlockNeighbours):
+        """Boids that see none of their flockmates leave their flock."""
+        herd.hasVisableNeighbours[:] = hasFlockNeighbours
+        for a in np.flatnonzero(~hasFlockNeighbours).tolist():
+            if herd.boids[a].flock.size > 1:
+                herd.boids[a].leaveFlock()
+
+    def flockTargets(self, herd, hasFlockNeighbours):
+        """
+        Heading and centroid offset of each boid's whole flock, for
+        flockAggregates, read from the flock roots' running sums less the
+        boid's own contribution.
+        """
+        roots, labels = flockLabels(herd)
+        sizes = np.array([root.size for root in roots])[labels]
+        sumPosition = np.array([root.sumPosition for root in roots]).reshape(-1, 2)[labels]
+        sumVelocity = np.array([root.sumVelocity for root in roots]).reshape(-1, 2)[labels]
+        rows = hasFlockNeighbours & (sizes > 1)
+        others = (sizes[rows] - 1)[:, None]
+        avgVelocity = np.zeros_like(herd.velocity)
+        avgVelocity[rows] = (sumVelocity[rows] - herd.velocity[rows])/others
+        meanPosition = np.zeros_like(herd.position)
+        meanPosition[rows] = (sumPosition[rows] - herd.position[rows])/others
+        return avgVelocity, meanPosition - herd.position
+
+
+def visibleNeighbours(params, positions, velocities, i, j):
+    """
+    The candidate pairs (i, j) in flockmate-range of i and inside its view
+    cone, with their offsets and squared distances. These are reused by
+    every rule in steerFlocking.
+    """
+    dist = positions[j] - positions[i]
+    mag2 = kernels.rowSsq(dist)
+    visible = mag2 <= params.flockmateRange2
+    visible[visible] = kernels.inViewCone(velocities[i[visible]], dist[visible], params.cosViewAngle)
+    return i[visible], j[visible], dist[visible], mag2[visible]
+
+
+def flockmatePairs(flockKeys, i, j, start, end):
+    """Which visible pairs of a herd (i local, j world indices) are in the same flock, given a key per boid."""
+    inFlock = (j >= start) & (j < end)
+    inFlock[inFlock] = flockKeys[i[inFlock]] == flockKeys[j[inFlock] - start]
+    return inFlock
+
+
+def steerFlocking(state, params, cls, terrain, i, dist, mag2, neighbourVelocity, inFlock, hasFlockNeighbours,
+                  avgVelocity, centerOffset, dt, jit=False):
+    """
+    Steering rules, terrain drag and integration for rows of a flocking herd.
+    state holds the rows' position, velocity, mass, goal, hasGoal, netForce
+    and acceleration arrays (a Herd, or a tile of one) and is updated in
+    place. i indexes those rows for each visible pair, sorted ascending.
+    avgVelocity and centerOffset are whole-flock targets per row, or None
+    to average over the visible flockmates.
+    """
+    n = len(state.position)
+    useAggregates = avgVelocity is not None
+
+    #terrain under each boid: one indexed read of the gradient and class rasters per boid
+    y, x = kernels.terrainIndices(terrain, state.position)
+    grad = terrain.gradientField[y, x]
+    terrainClass = terrain.typegrid[y, x]
+
+    if jit:
+        if not useAggregates:
+            avgVelocity = centerOffset = np.zeros((0, 2))  # the compiled kernel averages the flockmates itself
+        starts = np.searchsorted(i, np.arange(n + 1))
+        dragFactor = params.dragFactor*terrain_drag[terrainClass] if cls.navigatesTerrain else np.zeros(n)
+        herd_jit.flockStep(state.position, state.velocity, state.mass, state.netForce, state.acceleration,
+                           state.goal, state.hasGoal, cls.seeksGoal,
+                           starts, dist, mag2, neighbourVelocity, inFlock, useAggregates, avgVelocity, centerOffset,
+                           grad, terrain_speed[terrainClass], dragFactor, cls.navigatesTerrain,
+                           float(params.comfortZone), float(params.dangerZone), float(params.maxVelocity),
+                           float(params.cruisingSpeed), float(params.maxAcceleration), dt)
+        return
+
+    if not useAggregates:
+        fi = i[inFlock]
+        avgVelocity, _ = kernels.flockAverage(neighbourVelocity[inFlock], fi, n)
+        centerOffset, _ = kernels.flockAverage(dist[inFlock], fi, n)
+
+    # flocking behaviours, in priority order
+    acc = np.zeros((n, 2), dtype=float)
+    mag = np.zeros(n, dtype=float)
+    kernels.accumulate(acc, mag, kernels.keepDistance(dist, mag2, i, n, params.comfortZone, params.dangerZone))
+    kernels.accumulate(acc, mag, kernels.matchHeading(state.velocity, avgVelocity, hasFlockNeighbours, params.maxVelocity))
+    kernels.accumulate(acc, mag, kernels.steerToCenter(centerOffset, hasFlockNeighbours))
+    if cls.seeksGoal:
+        kernels.accumulate(acc, mag, kernels.gotoGoal(state.position, state.velocity, state.goal, state.hasGoal,
+                                                      params.cruisingSpeed, params.maxVelocity))
+    state.netForce[:] = acc*(params.maxAcceleration*state.mass[:, None])
+    state.acceleration[:] = state.netForce/state.mass[:, None]
+
+    #terrain navigation behaviour
+    if cls.navigatesTerrain:
+        dragFactor = params.dragFactor*terrain_drag[terrainClass]
+        state.netForce += kernels.navigateTerrain(state.velocity, grad, dragFactor)
+        state.acceleration[:] = state.netForce/state.mass[:, None]
+
+    kernels.updateVelocity(state.velocity, state.acceleration, dt, params.maxVelocity)
+    kernels.updatePosition(state.position, state.velocity, grad, terrain_speed[terrainClass], dt)
+
+
+def flockLabels(herd):
+    """The distinct flock roots of a herd, and the index into them of each boid's flock."""
+    roots = {}
+    labels = np.array([roots.setdefault(id(flock), (len(roots), flock))[0]
+                       for flock in (animal.flock for animal in herd.boids)], dtype=np.intp)
+    return [flock for _, flock in roots.values()], labels